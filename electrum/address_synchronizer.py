@@ -618,9 +618,14 @@ class AddressSynchronizer(Logger, EventListener):
         """Returns a key to be used for sorting txs."""
         with self.lock:
             tx_mined_info = self.get_tx_height(tx_hash)
-            height = self.tx_height_to_sort_height(tx_mined_info.height)
-            txpos = tx_mined_info.txpos or -1
-            return height, txpos
+            return self._tx_sort_key_from_mined_info(tx_mined_info)
+
+    @classmethod
+    def _tx_sort_key_from_mined_info(cls, tx_mined_info: TxMinedInfo) -> Tuple[int, int]:
+        """Returns the key _get_tx_sort_key would return for a tx with this mined info."""
+        height = cls.tx_height_to_sort_height(tx_mined_info.height)
+        txpos = tx_mined_info.txpos or -1
+        return height, txpos
 
     @classmethod
     def tx_height_to_sort_height(cls, height: int = None):
@@ -670,7 +675,9 @@ class AddressSynchronizer(Logger, EventListener):
             fee = self.get_tx_fee(tx_hash)
             for _asset, delta in tx_deltas[tx_hash].items():
                 history.append((tx_hash, tx_mined_status, _asset, delta, fee))
-        history.sort(key = lambda x: self._get_tx_sort_key(x[0]))
+        # note: sort on the mined status fetched above rather than calling
+        #       _get_tx_sort_key, which would look up the height of every row again
+        history.sort(key=lambda x: self._tx_sort_key_from_mined_info(x[1]))
         # 3. add balance
         h2 = []
         balance = defaultdict(int)
@@ -21,14 +21,18 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import os
+import hashlib
+import mmap
 import threading
 import time
 import struct
-from typing import Optional, Dict, Mapping, Sequence, TYPE_CHECKING, Tuple
+from functools import lru_cache
+from typing import Optional, Dict, List, Mapping, Sequence, TYPE_CHECKING, Tuple
+
+from aiorpcx import run_in_thread
 
 from . import util
-from .bitcoin import hash_encode, int_to_hex, rev_hex
-from .crypto import sha256d
+from .bitcoin import hash_encode
 from . import constants
 from .util import bfh, with_lock
 from .logging import get_logger, Logger
@@ -46,12 +50,41 @@ _logger = get_logger(__name__)
 MAX_TARGET = 0x00000fffffffffffffffffffffffffffffffffffffffffffffffffffffffffff
 KAWPOW_LIMIT = 0x0000000000ffffffffffffffffffffffffffffffffffffffffffffffffffffff
 MEOWPOW_LIMIT = 0x0000000000ffffffffffffffffffffffffffffffffffffffffffffffffffffff
+KAWPOW_RESET_HEIGHTS = range(373, 373 + 180)
+MEOWPOW_RESET_HEIGHTS = range(801212, 801212 + 180)
 
 HEADER_SIZE = 120  # bytes
 LEGACY_HEADER_SIZE = 80
+# allocated once; compared against on every header read
+_EMPTY_HEADER = bytes(HEADER_SIZE)
 
 DGW_PASTBLOCKS = 180
 
+# header PoW algorithms, in order of activation
+ALGO_X16R = 0
+ALGO_X16RV2 = 1
+ALGO_KAWPOW = 2
+ALGO_MEOWPOW = 3
+
+# PoW hashes are expensive (x16r/kawpow/meowpow), and the same header tends to
+# be hashed several times (verify_header, get_hash, check_header, fork, ...).
+# The cache is keyed on the serialized header, so header dicts stay untouched.
+POW_HASH_CACHE_SIZE = 4096
+# bits <-> target conversions are pure; bits rarely change within a chunk
+BITS_CACHE_SIZE = 4096
+# save_header only fsyncs every this many headers; headers lost in a crash
+# are simply downloaded again
+SAVE_HEADER_FSYNC_INTERVAL = 100
+
+# version, prev_block_hash, merkle_root, timestamp, bits, nheight, nonce, mix_hash
+_KAWPOW_HEADER_STRUCT = struct.Struct('<I32s32sIIIQ32s')
+# version, prev_block_hash, merkle_root, timestamp, bits, nonce
+_LEGACY_HEADER_STRUCT = struct.Struct('<I32s32sIII')
+# timestamp and bits sit at the same offset (68) in legacy and kawpow headers
+_TIMESTAMP_AND_BITS_STRUCT = struct.Struct('<II')
+_UINT32_STRUCT = struct.Struct('<I')
+_NONCE64_STRUCT = struct.Struct('<Q')
+
 class MissingHeader(Exception):
     pass
 
@@ -61,26 +94,24 @@ class InvalidHeader(Exception):
 class NotEnoughHeaders(Exception):
     pass
 
-def serialize_header(header_dict: dict) -> str:
-    ts = header_dict['timestamp']
+def serialize_header_bytes(header_dict: dict) -> bytes:
+    ts = int(header_dict['timestamp'])
+    buf = bytearray(HEADER_SIZE)  # zero-filled: pre-kawpow headers are padded to post kawpow header size
+    struct.pack_into('<I', buf, 0, header_dict['version'])
+    buf[4:36] = bytes.fromhex(header_dict['prev_block_hash'])[::-1]
+    buf[36:68] = bytes.fromhex(header_dict['merkle_root'])[::-1]
     if ts >= constants.net.KawpowActivationTS:
-        s = int_to_hex(header_dict['version'], 4) \
-            + rev_hex(header_dict['prev_block_hash']) \
-            + rev_hex(header_dict['merkle_root']) \
-            + int_to_hex(int(header_dict['timestamp']), 4) \
-            + int_to_hex(int(header_dict['bits']), 4) \
-            + int_to_hex(int(header_dict['nheight']), 4) \
-            + int_to_hex(int(header_dict['nonce']), 8) \
-            + rev_hex(header_dict['mix_hash'])
+        struct.pack_into('<IIIQ', buf, 68, ts, int(header_dict['bits']),
+                         int(header_dict['nheight']), int(header_dict['nonce']))
+        buf[88:120] = bytes.fromhex(header_dict['mix_hash'])[::-1]
     else:
-        s = int_to_hex(header_dict['version'], 4) \
-            + rev_hex(header_dict['prev_block_hash']) \
-            + rev_hex(header_dict['merkle_root']) \
-            + int_to_hex(int(header_dict['timestamp']), 4) \
-            + int_to_hex(int(header_dict['bits']), 4) \
-            + int_to_hex(int(header_dict['nonce']), 4)
-        s = s.ljust(HEADER_SIZE * 2, '0')  # pad with zeros to post kawpow header size
-    return s
+        struct.pack_into('<III', buf, 68, ts, int(header_dict['bits']), int(header_dict['nonce']))
+    if len(buf) != HEADER_SIZE:
+        raise InvalidHeader('Invalid header length: {}'.format(len(buf)))
+    return bytes(buf)
+
+def serialize_header(header_dict: dict) -> str:
+    return serialize_header_bytes(header_dict).hex()
 
 def deserialize_header(s: bytes, height: int) -> dict:
     if not s:
@@ -88,82 +119,154 @@ def deserialize_header(s: bytes, height: int) -> dict:
     if len(s) not in (LEGACY_HEADER_SIZE, HEADER_SIZE):
         raise InvalidHeader('Invalid header length: {}'.format(len(s)))
 
-    def hex_to_int(hex):
-        return int.from_bytes(hex, byteorder='little')
-
-    h = {'version': hex_to_int(s[0:4]),
-         'prev_block_hash': hash_encode(s[4:36]),
-         'merkle_root': hash_encode(s[36:68]),
-         'timestamp': int(hash_encode(s[68:72]), 16),
-         'bits': int(hash_encode(s[72:76]), 16)}
-    if h['timestamp'] >= constants.net.KawpowActivationTS:
-        h['nheight'] = int(hash_encode(s[76:80]), 16)
-        h['nonce'] = int(hash_encode(s[80:88]), 16)
-        h['mix_hash'] = hash_encode(s[88:120])
-    else:
-        h['nonce'] = int(hash_encode(s[76:80]), 16)
-    h['block_height'] = height
-    return h
+    if len(s) == HEADER_SIZE:
+        fields = _KAWPOW_HEADER_STRUCT.unpack(s)
+        if fields[3] >= constants.net.KawpowActivationTS:
+            return _kawpow_header_from_fields(fields, height)
+
+    # legacy header, possibly zero padded to HEADER_SIZE
+    version, prev_block_hash, merkle_root, timestamp, bits, nonce = _LEGACY_HEADER_STRUCT.unpack_from(s)
+    if timestamp >= constants.net.KawpowActivationTS:
+        raise InvalidHeader('Invalid header length for kawpow header: {}'.format(len(s)))
+    return {
+        'version': version,
+        'prev_block_hash': hash_encode(prev_block_hash),
+        'merkle_root': hash_encode(merkle_root),
+        'timestamp': timestamp,
+        'bits': bits,
+        'nonce': nonce,
+        'block_height': height,
+    }
+
+def _kawpow_header_from_fields(fields: tuple, height: int) -> dict:
+    version, prev_block_hash, merkle_root, timestamp, bits, nheight, nonce, mix_hash = fields
+    return {
+        'version': version,
+        'prev_block_hash': hash_encode(prev_block_hash),
+        'merkle_root': hash_encode(merkle_root),
+        'timestamp': timestamp,
+        'bits': bits,
+        'nheight': nheight,
+        'nonce': nonce,
+        'mix_hash': hash_encode(mix_hash),
+        'block_height': height,
+    }
+
+def _legacy_chunk_len(start_height: int, data_len: int) -> int:
+    """Returns how many leading bytes of a chunk starting at start_height hold
+    LEGACY_HEADER_SIZE headers. Header size only depends on height
+    (below KawpowActivationHeight), so no per-header inspection is needed.
+    """
+    num_legacy = max(0, constants.net.KawpowActivationHeight - start_height)
+    return min(data_len, num_legacy * LEGACY_HEADER_SIZE)
+
+def deserialize_chunk(data: bytes, start_height: int) -> List[dict]:
+    """Deserializes a run of consecutive headers starting at start_height.
+    Headers below KawpowActivationHeight are LEGACY_HEADER_SIZE bytes,
+    the rest HEADER_SIZE bytes; the latter are unpacked in a single pass.
+    """
+    legacy_len = _legacy_chunk_len(start_height, len(data))
+    if legacy_len % LEGACY_HEADER_SIZE != 0 or (len(data) - legacy_len) % HEADER_SIZE != 0:
+        raise InvalidHeader('Invalid chunk length: {}'.format(len(data)))
+    headers = [deserialize_header(data[p:p + LEGACY_HEADER_SIZE], start_height + i)
+               for i, p in enumerate(range(0, legacy_len, LEGACY_HEADER_SIZE))]
+    height = start_height + len(headers)
+    kawpow_ts = constants.net.KawpowActivationTS
+    for i, fields in enumerate(_KAWPOW_HEADER_STRUCT.iter_unpack(memoryview(data)[legacy_len:])):
+        if fields[3] < kawpow_ts:
+            p = legacy_len + i * HEADER_SIZE
+            headers.append(deserialize_header(data[p:p + HEADER_SIZE], height))
+        else:
+            headers.append(_kawpow_header_from_fields(fields, height))
+        height += 1
+    return headers
 
 def hash_header(header: dict) -> str:
     if header is None:
         return '0' * 64
     if header.get('prev_block_hash') is None:
         header['prev_block_hash'] = '00' * 32
-    if header['timestamp'] >= constants.net.KawpowActivationTS and header['timestamp'] < constants.net.MeowpowActivationTS:
-        return hash_raw_header_kawpow(serialize_header(header))
-    elif header['timestamp'] >= constants.net.MeowpowActivationTS:
-        return hash_raw_header_meowpow(serialize_header(header))
-    elif header['timestamp'] >= constants.net.X16Rv2ActivationTS:
-        hdr = serialize_header(header)[:80 * 2]
-        h = hash_raw_header_v2(hdr)
-        return h
+    return hash_bin_header(serialize_header_bytes(header))
+
+def header_algo_id(timestamp: int) -> int:
+    """Returns the PoW algorithm (ALGO_*) of a header with the given timestamp."""
+    net = constants.net
+    if net.KawpowActivationTS <= timestamp < net.MeowpowActivationTS:
+        return ALGO_KAWPOW
+    elif timestamp >= net.MeowpowActivationTS:
+        return ALGO_MEOWPOW
+    elif timestamp >= net.X16Rv2ActivationTS:
+        return ALGO_X16RV2
     else:
-        hdr = serialize_header(header)[:80 * 2]
-        h = hash_raw_header_v1(hdr)
-        return h
+        return ALGO_X16R
+
+def hash_bin_header(hdr_bin: bytes) -> str:
+    """Hashes a serialized header (LEGACY_HEADER_SIZE or HEADER_SIZE bytes),
+    picking the PoW algorithm from its timestamp.
+    """
+    algo = header_algo_id(_UINT32_STRUCT.unpack_from(hdr_bin, 68)[0])
+    size = HEADER_SIZE if algo in (ALGO_KAWPOW, ALGO_MEOWPOW) else LEGACY_HEADER_SIZE
+    return _HASH_FNS[algo](bytes(hdr_bin[:size]))
 
 
+@lru_cache(maxsize=POW_HASH_CACHE_SIZE)
+def hash_bin_header_v1(hdr_bin: bytes) -> str:
+    return hash_encode(x16r_hash.getPoWHash(hdr_bin[:80]))
+
+@lru_cache(maxsize=POW_HASH_CACHE_SIZE)
+def hash_bin_header_v2(hdr_bin: bytes) -> str:
+    return hash_encode(x16rv2_hash.getPoWHash(hdr_bin[:80]))
+
 def hash_raw_header_v1(header: str) -> str:
-    raw_hash = x16r_hash.getPoWHash(bfh(header)[:80])
-    hash_result = hash_encode(raw_hash)
-    return hash_result
+    return hash_bin_header_v1(bfh(header)[:80])
 
 def hash_raw_header_v2(header: str) -> str:
-    raw_hash = x16rv2_hash.getPoWHash(bfh(header)[:80])
-    hash_result = hash_encode(raw_hash)
-    return hash_result
+    return hash_bin_header_v2(bfh(header)[:80])
 
 def revb(data):
-    b = bytearray(data)
-    b.reverse()
-    return bytes(b)
+    return bytes(data[::-1])
+
+
+def _progpow_header_hash(hdr_bin: bytes) -> bytes:
+    # sha256d of the 80 byte header prefix, reversed; calls hashlib directly,
+    # skipping the type coercion and copies of crypto.sha256d
+    return hashlib.sha256(hashlib.sha256(hdr_bin[:80]).digest()).digest()[::-1]
 
 
 def kawpow_hash(hdr_bin):
-    header_hash = revb(sha256d(hdr_bin[:80]))
+    header_hash = _progpow_header_hash(hdr_bin)
     mix_hash = revb(hdr_bin[88:120])
-    nNonce64 = struct.unpack("< Q", hdr_bin[80:88])[0]
+    nNonce64 = _NONCE64_STRUCT.unpack_from(hdr_bin, 80)[0]
     final_hash = revb(kawpow.light_verify(header_hash, mix_hash, nNonce64))
     return final_hash
 
 
+@lru_cache(maxsize=POW_HASH_CACHE_SIZE)
+def hash_bin_header_kawpow(hdr_bin: bytes) -> str:
+    return hash_encode(kawpow_hash(hdr_bin))
+
 def hash_raw_header_kawpow(header: str) -> str:
-    final_hash = hash_encode(kawpow_hash(bfh(header)))
-    return final_hash
+    return hash_bin_header_kawpow(bfh(header))
 
 
 def meowpow_hash(hdr_bin):
-    header_hash = revb(sha256d(hdr_bin[:80]))
+    header_hash = _progpow_header_hash(hdr_bin)
     mix_hash = revb(hdr_bin[88:120])
-    nNonce64 = struct.unpack("< Q", hdr_bin[80:88])[0]
+    nNonce64 = _NONCE64_STRUCT.unpack_from(hdr_bin, 80)[0]
     final_hash = revb(meowpow.light_verify(header_hash, mix_hash, nNonce64))
     return final_hash
 
 
+@lru_cache(maxsize=POW_HASH_CACHE_SIZE)
+def hash_bin_header_meowpow(hdr_bin: bytes) -> str:
+    return hash_encode(meowpow_hash(hdr_bin))
+
 def hash_raw_header_meowpow(header: str) -> str:
-    final_hash = hash_encode(meowpow_hash(bfh(header)))
-    return final_hash
+    return hash_bin_header_meowpow(bfh(header))
+
+
+# indexed by ALGO_*
+_HASH_FNS = (hash_bin_header_v1, hash_bin_header_v2, hash_bin_header_kawpow, hash_bin_header_meowpow)
 
 
 # key: blockhash hex at forkpoint
@@ -173,6 +276,7 @@ blockchains_lock = threading.RLock()  # lock order: take this last; so after Blo
 
 
 def read_blockchains(config: 'SimpleConfig'):
+    load_chainwork_cache(config)
     best_chain = Blockchain(config=config,
                             forkpoint=0,
                             parent=None,
@@ -184,6 +288,7 @@ def read_blockchains(config: 'SimpleConfig'):
         header_after_cp = best_chain.read_header(constants.net.max_checkpoint()+1)
         if not header_after_cp or not best_chain.can_connect(header_after_cp, check_height=False):
             _logger.info("[blockchain] deleting best chain. cannot connect header after last cp to last cp.")
+            best_chain._close_mmap()
             os.unlink(best_chain.path())
             best_chain.update_size()
     # forks
@@ -206,8 +311,12 @@ def read_blockchains(config: 'SimpleConfig'):
         if forkpoint <= constants.net.max_checkpoint():
             delete_chain(filename, "deleting fork below max checkpoint")
             return
-        # find parent (sorting by forkpoint guarantees it's already instantiated)
+        # find parent (sorting by forkpoint guarantees it's already instantiated).
+        # Only a chain that stores forkpoint-1 itself can be the parent, so skip
+        # the others before computing any block hash.
         for parent in blockchains.values():
+            if not (parent.forkpoint <= forkpoint - 1 <= parent.height()):
+                continue
             if parent.check_hash(forkpoint - 1, prev_hash):
                 break
         else:
@@ -220,6 +329,7 @@ def read_blockchains(config: 'SimpleConfig'):
                        prev_hash=prev_hash)
         # consistency checks
         h = b.read_header(b.forkpoint)
+        b._close_mmap()  # we might delete the file below
         if first_hash != hash_header(h):
             delete_chain(filename, "incorrect first hash for chain")
             return
@@ -232,11 +342,21 @@ def read_blockchains(config: 'SimpleConfig'):
 
     for filename in l:
         instantiate_chain(filename)
+    flush_chainwork_cache(config)
 
 
 def get_best_chain() -> 'Blockchain':
     return blockchains[constants.net.GENESIS]
 
+
+def flush_blockchains(config: 'SimpleConfig') -> None:
+    """fsync headers that save_header has not synced yet,
+    and persist the chainwork cache if it changed"""
+    with blockchains_lock: chains = list(blockchains.values())
+    for b in chains:
+        b.flush()
+    flush_chainwork_cache(config)
+
 # block hash -> chain work; up to and including that block
 _CHAINWORK_CACHE = {
     "0000000000000000000000000000000000000000000000000000000000000000": 0,  # virtual block at height -1
@@ -245,18 +365,86 @@ _CHAINWORK_CACHE = {
 if len(constants.net.DGW_CHECKPOINTS) > 0:
     _CHAINWORK_CACHE[constants.net.DGW_CHECKPOINTS[-1][1][0]] = 0  # set start of cache to 0 work
 
+# On disk, the cache is a flat list of (block hash, chain work) records.
+# The first record is the block the cached work is counted from, so a file
+# written against a different checkpoint is never mixed in.
+CHAINWORK_CACHE_FILENAME = 'chainwork_cache'
+_CHAINWORK_RECORD = struct.Struct('>32s32s')
+_chainwork_cache_file_lock = threading.Lock()
+# set when _CHAINWORK_CACHE gains entries that are not on disk yet.
+# get_chainwork runs under the chain locks, so it only sets this;
+# flush_chainwork_cache does the (slow) write later, outside the locks.
+_chainwork_cache_dirty = False
+
+
+def _chainwork_cache_base() -> str:
+    if len(constants.net.DGW_CHECKPOINTS) > 0:
+        return constants.net.DGW_CHECKPOINTS[-1][1][0]
+    return "0000000000000000000000000000000000000000000000000000000000000000"
+
+
+def _chainwork_cache_path(config: 'SimpleConfig') -> str:
+    return os.path.join(util.get_headers_dir(config), CHAINWORK_CACHE_FILENAME)
+
+
+def load_chainwork_cache(config: 'SimpleConfig') -> None:
+    path = _chainwork_cache_path(config)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return
+    if len(data) == 0 or len(data) % _CHAINWORK_RECORD.size != 0:
+        _logger.info(f"[blockchain] ignoring chainwork cache: unexpected size {len(data)}")
+        return
+    records = [(block_hash.hex(), int.from_bytes(work, 'big'))
+               for block_hash, work in _CHAINWORK_RECORD.iter_unpack(data)]
+    if records[0] != (_chainwork_cache_base(), 0):
+        _logger.info("[blockchain] ignoring chainwork cache: written for a different checkpoint")
+        return
+    _CHAINWORK_CACHE.update(records)
+
+
+def save_chainwork_cache(config: 'SimpleConfig') -> None:
+    global _chainwork_cache_dirty
+    base = _chainwork_cache_base()
+    with _chainwork_cache_file_lock:
+        _chainwork_cache_dirty = False
+        data = bytearray(_CHAINWORK_RECORD.pack(bytes.fromhex(base), bytes(32)))
+        for block_hash, work in list(_CHAINWORK_CACHE.items()):
+            if block_hash == base or work.bit_length() > 256:
+                continue
+            data += _CHAINWORK_RECORD.pack(bytes.fromhex(block_hash), work.to_bytes(32, 'big'))
+        path = _chainwork_cache_path(config)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+def flush_chainwork_cache(config: 'SimpleConfig') -> None:
+    if not _chainwork_cache_dirty:
+        return
+    try:
+        save_chainwork_cache(config)
+    except OSError as e:
+        _logger.info(f"[blockchain] failed to save chainwork cache: {e!r}")
+
 
 def init_headers_file_for_best_chain():
     b = get_best_chain()
     filename = b.path()
     length = HEADER_SIZE * (constants.net.max_checkpoint() + 1)
-    if not os.path.exists(filename) or os.path.getsize(filename) < length:
-        with open(filename, 'wb') as f:
-            if length > 0:
-                f.seek(length - 1)
-                f.write(b'\x00')
-        util.ensure_sparse_file(filename)
     with b.lock:
+        if not os.path.exists(filename) or os.path.getsize(filename) < length:
+            b._close_mmap()
+            with open(filename, 'wb') as f:
+                if length > 0:
+                    f.seek(length - 1)
+                    f.write(b'\x00')
+            util.ensure_sparse_file(filename)
         b.update_size()
 
 
@@ -279,6 +467,10 @@ class Blockchain(Logger):
         self._forkpoint_hash = forkpoint_hash  # blockhash at forkpoint. "first hash"
         self._prev_hash = prev_hash  # blockhash immediately before forkpoint
         self.lock = threading.RLock()
+        self._mmap = None  # type: Optional[mmap.mmap]  # read-only view of our headers file, opened lazily
+        self._path = None  # type: Optional[str]
+        self._unsynced_writes = 0  # writes not yet fsynced to disk
+        self._last_chainwork = (None, 0)  # type: Tuple[Optional[str], int]  # (block hash, chain work up to it)
         self.update_size()
 
     @property
@@ -379,49 +571,62 @@ class Blockchain(Logger):
     def update_size(self) -> None:
         p = self.path()
         self._size = os.path.getsize(p)//HEADER_SIZE if os.path.exists(p) else 0
+        # the file changed (or got renamed); remap on next read
+        self._close_mmap()
+
+    @with_lock
+    def _close_mmap(self) -> None:
+        # note: must be called before the file is truncated, replaced or deleted
+        #       (on Windows these fail while a mapping is open)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    @with_lock
+    def _get_mmap(self) -> mmap.mmap:
+        if self._mmap is None:
+            name = self.path()
+            self.assert_headers_file_available(name)
+            with open(name, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
 
     @classmethod
-    def verify_header(cls, header: dict, prev_hash: str, target: int, expected_header_hash: str=None) -> None:
+    def verify_header(cls, header: dict, prev_hash: str, target: int, expected_header_hash: str=None) -> str:
+        """Raises InvalidHeader if header is not valid. Returns the header hash."""
         _hash = hash_header(header)
         if expected_header_hash and expected_header_hash != _hash:
             raise InvalidHeader("hash mismatches with expected: {} vs {}".format(expected_header_hash, _hash))
         if prev_hash != header.get('prev_block_hash'):
             raise InvalidHeader("prev hash mismatch: %s vs %s" % (prev_hash, header.get('prev_block_hash')))
         if constants.net.TESTNET:
-            return
+            return _hash
         bits = cls.target_to_bits(target)
         if bits != header.get('bits'):
             raise InvalidHeader("bits mismatch: %s vs %s" % (bits, header.get('bits')))
-        block_hash_as_num = int.from_bytes(bfh(_hash), byteorder='big')
+        block_hash_as_num = int(_hash, 16)
         if block_hash_as_num > target:
             raise InvalidHeader(f"insufficient proof of work: {block_hash_as_num} vs target {target}")
+        return _hash
 
     def verify_chunk(self, start_height: int, data: bytes) -> None:
-        raw = []
-        p = 0
         s = start_height
         prev_hash = self.get_hash(start_height - 1)
         headers = {}
-        while p < len(data):
-            if s < constants.net.KawpowActivationHeight:
-                raw = data[p:p + LEGACY_HEADER_SIZE]
-                p += LEGACY_HEADER_SIZE
-            else:
-                raw = data[p:p + HEADER_SIZE]
-                p += HEADER_SIZE
+        # loop invariants
+        dgw_checkpoints_start = constants.net.DGW_CHECKPOINTS_START
+        max_checkpoint = constants.net.max_checkpoint()
+        for header in deserialize_chunk(data, start_height):
             try:
                 expected_header_hash = self.get_hash(s)
             except MissingHeader:
                 expected_header_hash = None
-            if len(raw) not in (LEGACY_HEADER_SIZE, HEADER_SIZE):
-                raise Exception('Invalid header length: {}'.format(len(raw)))
-            header = deserialize_header(raw, s)
             headers[header.get('block_height')] = header
-            
+
             # Don't bother with the target of headers in the middle of
             # DGW checkpoints
             target = 0
-            if constants.net.DGW_CHECKPOINTS_START <= s <= constants.net.max_checkpoint():
+            if dgw_checkpoints_start <= s <= max_checkpoint:
                 if self.is_dgw_height_checkpoint(s) is not None:
                     target = self.get_target(s, headers)
                 else:
@@ -429,18 +634,20 @@ class Blockchain(Logger):
                     target = self.bits_to_target(header['bits'])
             else:
                 target = self.get_target(s, headers)
-            
-            self.verify_header(header, prev_hash, target, expected_header_hash)
-            prev_hash = hash_header(header)
+
+            prev_hash = self.verify_header(header, prev_hash, target, expected_header_hash)
             s += 1
 
         # DGW must be received in correct chunk sizes to be valid with our checkpoints
-        if constants.net.DGW_CHECKPOINTS_START <= start_height <= constants.net.max_checkpoint():
+        if dgw_checkpoints_start <= start_height <= max_checkpoint:
             assert start_height % constants.net.DGW_CHECKPOINTS_SPACING == 0, 'dgw chunk not from start'
             assert s - start_height == constants.net.DGW_CHECKPOINTS_SPACING, 'dgw chunk not correct size'
 
     @with_lock
     def path(self):
+        # cached; _swap_with_parent resets it when the fork parameters change
+        if self._path is not None:
+            return self._path
         d = util.get_headers_dir(self.config)
         if self.parent is None:
             filename = 'blockchain_headers'
@@ -450,7 +657,8 @@ class Blockchain(Logger):
             first_hash = self._forkpoint_hash.lstrip('0')
             basename = f'fork2_{self.forkpoint}_{prev_hash}_{first_hash}'
             filename = os.path.join('forks', basename)
-        return os.path.join(d, filename)
+        self._path = os.path.join(d, filename)
+        return self._path
 
     @with_lock
     def save_chunk(self, start_height: int, chunk: bytes):
@@ -472,24 +680,27 @@ class Blockchain(Logger):
         truncate = not chunk_within_checkpoint_region
 
         def convert_to_kawpow_len():
-            r = b''
-            p = 0
-            s = start_height
-            while p < len(chunk):
-                if s < constants.net.KawpowActivationHeight:
-                    r += chunk[p:p + LEGACY_HEADER_SIZE] + bytes(40)
-                    p += LEGACY_HEADER_SIZE
-                else:
-                    r += chunk[p:p + HEADER_SIZE]
-                    p += HEADER_SIZE
-                s += 1
+            legacy_len = _legacy_chunk_len(start_height, len(chunk))
+            if legacy_len == 0:
+                r = chunk
+            else:
+                # legacy headers get zero padding, which the bytearray already has;
+                # everything after them is already HEADER_SIZE aligned
+                num_legacy = legacy_len // LEGACY_HEADER_SIZE
+                r = bytearray(num_legacy * HEADER_SIZE + len(chunk) - legacy_len)
+                w = 0
+                for p in range(0, legacy_len, LEGACY_HEADER_SIZE):
+                    r[w:w + LEGACY_HEADER_SIZE] = chunk[p:p + LEGACY_HEADER_SIZE]
+                    w += HEADER_SIZE
+                r[w:] = chunk[legacy_len:]
             if len(r) % HEADER_SIZE != 0:
                 raise Exception('Header extension error')
-            return r
+            return bytes(r)
 
         chunk = convert_to_kawpow_len()
         self.write(chunk, delta_bytes, truncate)
-        assert self.read_header(start_height) == deserialize_header(chunk[:120], start_height)
+        # sanity check the write; comparing bytes avoids deserializing both sides
+        assert self._read_raw_header(start_height) == chunk[:HEADER_SIZE]
         self.swap_with_parent()
 
     def swap_with_parent(self) -> None:
@@ -529,21 +740,25 @@ class Blockchain(Logger):
         # parent's new name will be something new (not child's old name)
         self.assert_headers_file_available(self.path())
         child_old_name = self.path()
-        with open(self.path(), 'rb') as f:
-            my_data = f.read()
+        my_data = self._read_raw_headers(forkpoint, self.size())
         self.assert_headers_file_available(parent.path())
         assert forkpoint > parent.forkpoint, (f"forkpoint of parent chain ({parent.forkpoint}) "
                                               f"should be at lower height than children's ({forkpoint})")
-        with open(parent.path(), 'rb') as f:
-            f.seek((forkpoint - parent.forkpoint)*HEADER_SIZE)
-            parent_data = f.read(parent_branch_size*HEADER_SIZE)
-        self.write(parent_data, 0)
-        parent.write(my_data, (forkpoint - parent.forkpoint)*HEADER_SIZE)
+        # copy the parent's branch straight out of its mapping; the view must be
+        # released before parent.write() closes that mapping
+        offset = (forkpoint - parent.forkpoint)*HEADER_SIZE
+        with parent.lock, memoryview(parent._get_mmap()) as parent_view:
+            with parent_view[offset:offset + parent_branch_size*HEADER_SIZE] as parent_data:
+                assert len(parent_data) == parent_branch_size*HEADER_SIZE, (len(parent_data), parent_branch_size)
+                parent_first_header = bytes(parent_data[:HEADER_SIZE])
+                self.write(parent_data, 0)
+        parent.write(my_data, offset)
         # swap parameters
         self.parent, parent.parent = parent.parent, self  # type: Tuple[Optional[Blockchain], Optional[Blockchain]]
         self.forkpoint, parent.forkpoint = parent.forkpoint, self.forkpoint
-        self._forkpoint_hash, parent._forkpoint_hash = parent._forkpoint_hash, hash_header(deserialize_header(parent_data[:HEADER_SIZE], forkpoint))
+        self._forkpoint_hash, parent._forkpoint_hash = parent._forkpoint_hash, hash_bin_header(parent_first_header)
         self._prev_hash, parent._prev_hash = parent._prev_hash, self._prev_hash
+        self._path = parent._path = None
         # parent's new name
         os.replace(child_old_name, parent.path())
         self.update_size()
@@ -567,48 +782,103 @@ class Blockchain(Logger):
             raise FileNotFoundError('Cannot find headers file but headers_dir is there. Should be at {}'.format(path))
 
     @with_lock
-    def write(self, data: bytes, offset: int, truncate: bool=True) -> None:
+    def write(self, data: bytes, offset: int, truncate: bool=True, *, sync: bool=True) -> None:
         filename = self.path()
         self.assert_headers_file_available(filename)
+        self._close_mmap()
         with open(filename, 'rb+') as f:
-            if truncate and offset != self._size * HEADER_SIZE:
-                f.seek(offset)
-                f.truncate()
             f.seek(offset)
+            if truncate and offset != self._size * HEADER_SIZE:
+                f.truncate()  # at the current position
             f.write(data)
             f.flush()
-            os.fsync(f.fileno())
+            if sync:
+                os.fsync(f.fileno())
+                self._unsynced_writes = 0
+            else:
+                self._unsynced_writes += 1
         self.update_size()
 
+    @with_lock
+    def flush(self) -> None:
+        """fsync writes that were made with sync=False"""
+        if not self._unsynced_writes:
+            return
+        filename = self.path()
+        if os.path.exists(filename):
+            with open(filename, 'rb+') as f:
+                os.fsync(f.fileno())
+        self._unsynced_writes = 0
+
     @with_lock
     def save_header(self, header: dict) -> None:
         delta = header.get('block_height') - self.forkpoint
-        data = bfh(serialize_header(header))
+        data = serialize_header_bytes(header)
         # headers are only _appended_ to the end:
         assert delta == self.size(), (delta, self.size())
         assert len(data) == HEADER_SIZE
-        self.write(data, delta*HEADER_SIZE)
+        sync = self._unsynced_writes + 1 >= SAVE_HEADER_FSYNC_INTERVAL
+        self.write(data, delta*HEADER_SIZE, sync=sync)
         self.swap_with_parent()
 
     @with_lock
     def read_header(self, height: int) -> Optional[dict]:
+        h = self._read_raw_header(height)
+        if h is None:
+            return None
+        return deserialize_header(h, height)
+
+    @with_lock
+    def _read_raw_header(self, height: int) -> Optional[bytes]:
+        """Returns the HEADER_SIZE bytes stored for height, or None if unknown."""
         if height < 0:
             return
         if height < self.forkpoint:
-            return self.parent.read_header(height)
+            return self.parent._read_raw_header(height)
         if height > self.height():
             return
         delta = height - self.forkpoint
-        name = self.path()
-        self.assert_headers_file_available(name)
-        with open(name, 'rb') as f:
-            f.seek(delta * HEADER_SIZE)
-            h = f.read(HEADER_SIZE)
-            if len(h) < HEADER_SIZE:
-                raise Exception('Expected to read a full header. This was only {} bytes'.format(len(h)))
-        if h == bytes([0])*HEADER_SIZE:
+        h = self._get_mmap()[delta * HEADER_SIZE:(delta + 1) * HEADER_SIZE]
+        if len(h) < HEADER_SIZE:
+            raise Exception('Expected to read a full header. This was only {} bytes'.format(len(h)))
+        if h == _EMPTY_HEADER:
             return None
-        return deserialize_header(h, height)
+        return h
+
+    @with_lock
+    def _read_raw_headers(self, start_height: int, count: int) -> bytes:
+        """Returns the bytes of count consecutive headers stored in our own file."""
+        assert self.forkpoint <= start_height and start_height + count - 1 <= self.height(), (start_height, count)
+        delta = start_height - self.forkpoint
+        data = self._get_mmap()[delta * HEADER_SIZE:(delta + count) * HEADER_SIZE]
+        if len(data) < count * HEADER_SIZE:
+            raise Exception('Expected to read {} headers. Only got {} bytes'.format(count, len(data)))
+        return data
+
+    @with_lock
+    def _read_timestamps_and_bits(self, start_height: int, count: int) -> Tuple[List[Optional[int]], List[Optional[int]]]:
+        """Returns the timestamps and bits of count consecutive headers as two
+        parallel lists, with None for headers we don't have.
+        Headers below our forkpoint are read from the parent chains."""
+        timestamps = [None] * count  # type: List[Optional[int]]
+        bits = [None] * count  # type: List[Optional[int]]
+        end = start_height + count
+        chain = self
+        while chain is not None and end > start_height:
+            lo = max(start_height, chain.forkpoint)
+            hi = min(end, chain.height() + 1)
+            if lo < hi:
+                raw = chain._read_raw_headers(lo, hi - lo)
+                for i in range(hi - lo):
+                    offset = i * HEADER_SIZE
+                    t, b = _TIMESTAMP_AND_BITS_STRUCT.unpack_from(raw, offset + 68)
+                    if b == 0 and raw[offset:offset + HEADER_SIZE] == _EMPTY_HEADER:
+                        continue
+                    timestamps[lo - start_height + i] = t
+                    bits[lo - start_height + i] = b
+            end = min(end, chain.forkpoint)
+            chain = chain.parent
+        return timestamps, bits
 
     def header_at_tip(self) -> Optional[dict]:
         """Return latest header."""
@@ -631,45 +901,46 @@ class Blockchain(Logger):
 
     @staticmethod
     def is_dgw_height_checkpoint(height) -> Optional[int]:
+        net = constants.net
         # Less than the start of saved checkpoints
-        if height < constants.net.DGW_CHECKPOINTS_START:
+        if height < net.DGW_CHECKPOINTS_START:
             return None
         # Greater than the end of the saved checkpoints
-        if height > constants.net.max_checkpoint():
+        if height > net.max_checkpoint():
             return None
-        height_mod = height % constants.net.DGW_CHECKPOINTS_SPACING
+        spacing = net.DGW_CHECKPOINTS_SPACING
+        height_mod = height % spacing
         # Is the first saved
         if height_mod == 0:
             return 0
         # Is the last saved
-        elif height_mod == constants.net.DGW_CHECKPOINTS_SPACING - 1:
+        elif height_mod == spacing - 1:
             return 1
         return None
 
     def get_hash(self, height: int) -> str:
-        def is_height_checkpoint():
-            within_cp_range = height <= constants.net.max_legacy_checkpoint()
-            at_chunk_boundary = (height + 1) % 2016 == 0
-            return within_cp_range and at_chunk_boundary
-
-        dgw_height_checkpoint = self.is_dgw_height_checkpoint(height)
+        net = constants.net
         if height == -1:
             return '0000000000000000000000000000000000000000000000000000000000000000'
         elif height == 0:
-            return constants.net.GENESIS
-        elif is_height_checkpoint():
+            return net.GENESIS
+        # legacy checkpoint at the end of a 2016 block chunk
+        elif (height + 1) % 2016 == 0 and height <= net.max_legacy_checkpoint():
             index = height // 2016
             h, t = self.legacy_checkpoints[index]
             return h
-        elif dgw_height_checkpoint is not None:
-            index = height // constants.net.DGW_CHECKPOINTS_SPACING - constants.net.DGW_CHECKPOINTS_START // constants.net.DGW_CHECKPOINTS_SPACING
+        dgw_height_checkpoint = self.is_dgw_height_checkpoint(height)
+        if dgw_height_checkpoint is not None:
+            spacing = net.DGW_CHECKPOINTS_SPACING
+            index = height // spacing - net.DGW_CHECKPOINTS_START // spacing
             h, t = self.checkpoints[index][dgw_height_checkpoint]
             return h
         else:
-            header = self.read_header(height)
-            if header is None:
+            # hash the stored bytes directly; no need to build a header dict
+            raw_header = self._read_raw_header(height)
+            if raw_header is None:
                 raise MissingHeader(height)
-            return hash_header(header)
+            return hash_bin_header(raw_header)
 
     def get_target(self, height: int, chain=None) -> int:         
         dgw_height_checkpoint = self.is_dgw_height_checkpoint(height)
@@ -693,10 +964,10 @@ class Blockchain(Logger):
             h, t = self.checkpoints[index][dgw_height_checkpoint]
             return t
         # There was a difficulty reset for kawpow
-        elif not constants.net.TESTNET and height in range(373, 373 + 180):  # kawpow reset
+        elif not constants.net.TESTNET and height in KAWPOW_RESET_HEIGHTS:  # kawpow reset
             return KAWPOW_LIMIT
         # There was a difficulty reset for meowpow
-        elif not constants.net.TESTNET and height in range(801212, 801212 + 180):  # meowpow reset
+        elif not constants.net.TESTNET and height in MEOWPOW_RESET_HEIGHTS:  # meowpow reset
             return MEOWPOW_LIMIT
         # If we have a DWG header already saved to our header cache (i.e. for a reorg), get that
         elif height <= self.height():
@@ -716,45 +987,47 @@ class Blockchain(Logger):
 
     def get_target_dgwv3(self, height, chain=None) -> int:
 
+        # Only timestamp and bits are needed. Get those of the stored headers in
+        # the window in one pass; the loop below also reads the block before it.
+        window_start = height - 1 - DGW_PASTBLOCKS
+        stored_timestamps, stored_bits = self._read_timestamps_and_bits(window_start, DGW_PASTBLOCKS + 1)
+
         def get_block_reading_from_height(height):
             last = None
             try:
                 last = chain.get(height)
             except Exception:
                 pass
-            if last is None:
-                last = self.read_header(height)
-            if last is None:
+            if last is not None:
+                return last['timestamp'], last['bits']
+            i = height - window_start
+            if stored_timestamps[i] is None:
                 raise NotEnoughHeaders()
-            return last
-
-        # params
-        BlockReading = get_block_reading_from_height(height - 1)
-        nActualTimespan = 0
-        LastBlockTime = 0
-        PastBlocksMin = DGW_PASTBLOCKS
-        PastBlocksMax = DGW_PASTBLOCKS
-        CountBlocks = 0
-        PastDifficultyAverage = 0
-        PastDifficultyAveragePrev = 0
+            return stored_timestamps[i], stored_bits[i]
 
-        for _ in range(PastBlocksMax):
-            CountBlocks += 1
+        # newest first: blocks height-1 ... height-DGW_PASTBLOCKS. Like the
+        # reference loop, we also need the block before the window to exist.
+        readings = [get_block_reading_from_height(height - 1 - i) for i in range(DGW_PASTBLOCKS + 1)]
+        del readings[-1]
+        CountBlocks = len(readings)
 
-            if CountBlocks <= PastBlocksMin:
-                if CountBlocks == 1:
-                    PastDifficultyAverage = self.convbignum(BlockReading.get('bits'))
-                else:
-                    bnNum = self.convbignum(BlockReading.get('bits'))
-                    PastDifficultyAverage = ((PastDifficultyAveragePrev * CountBlocks) + (bnNum)) // (CountBlocks + 1)
-                PastDifficultyAveragePrev = PastDifficultyAverage
-
-            if LastBlockTime > 0:
-                Diff = (LastBlockTime - BlockReading.get('timestamp'))
-                nActualTimespan += Diff
-            LastBlockTime = BlockReading.get('timestamp')
-
-            BlockReading = get_block_reading_from_height((height - 1) - CountBlocks)
+        # The running average floors at every step, so it has to stay sequential.
+        PastDifficultyAverage = 0
+        for n, (_, BlockBits) in enumerate(readings, start=1):
+            bnNum = self.convbignum(BlockBits)
+            if n == 1:
+                PastDifficultyAverage = bnNum
+            else:
+                PastDifficultyAverage = ((PastDifficultyAverage * n) + bnNum) // (n + 1)
+
+        # The sum of consecutive time differences telescopes to newest - oldest.
+        # The reference loop skips the difference after a zero timestamp, so
+        # only take the shortcut when there is none.
+        timestamps = [t for t, _ in readings]
+        if all(timestamps):
+            nActualTimespan = timestamps[0] - timestamps[-1]
+        else:
+            nActualTimespan = sum(newer - older for newer, older in zip(timestamps, timestamps[1:]) if newer > 0)
 
         bnNew = PastDifficultyAverage
         nTargetTimespan = CountBlocks * 60  # 1 min
@@ -770,6 +1043,7 @@ class Blockchain(Logger):
         return bnNew
 
     @classmethod
+    @lru_cache(maxsize=BITS_CACHE_SIZE)
     def bits_to_target(cls, bits: int) -> int:
         # arith_uint256::SetCompact in Bitcoin Core
         if not (0 <= bits < (1 << 32)):
@@ -791,6 +1065,7 @@ class Blockchain(Logger):
         return target
 
     @classmethod
+    @lru_cache(maxsize=BITS_CACHE_SIZE)
     def target_to_bits(cls, target: int) -> int:
         # arith_uint256::GetCompact in Bitcoin Core
         # see https://github.com/bitcoin/bitcoin/blob/7fcf53f7b4524572d1d0c9a5fdc388e87eb02416/src/arith_uint256.cpp#L223
@@ -807,21 +1082,59 @@ class Blockchain(Logger):
             bitsBase >>= 8
         return bitsN << 24 | bitsBase
 
+    @staticmethod
+    def work_from_target(target: int) -> int:
+        return ((2 ** 256 - target - 1) // (target + 1)) + 1
+
     def chainwork_of_header_at_height(self, height: int) -> int:
         """work done by single header at given height"""
         target = self.get_target(height)
-        work = ((2 ** 256 - target - 1) // (target + 1)) + 1
+        return self.work_from_target(target)
+
+    @with_lock
+    def _chainwork_of_headers(self, start_height: int, count: int) -> int:
+        """work done by the count headers starting at start_height"""
+        # Past the checkpoints and difficulty resets, the target of a header we
+        # store is given by its own bits. Read those straight out of one slice
+        # of the headers file instead of going through get_target/read_header.
+        own_start = max(start_height, self.forkpoint)
+        own_end = min(start_height + count, self.height() + 1)
+        raw = self._read_raw_headers(own_start, own_end - own_start) if own_end > own_start else b''
+        first_bits_height = max(constants.net.max_checkpoint() + 1, constants.net.nDGWActivationBlock)
+        work = 0
+        for height in range(start_height, start_height + count):
+            bits = 0
+            if (own_start <= height < own_end and height >= first_bits_height
+                    and height not in KAWPOW_RESET_HEIGHTS and height not in MEOWPOW_RESET_HEIGHTS):
+                bits = _UINT32_STRUCT.unpack_from(raw, (height - own_start) * HEADER_SIZE + 72)[0]
+            if bits:
+                target = self.bits_to_target(bits)
+            else:
+                # checkpoints, resets, parent chain, or missing header
+                target = self.get_target(height)
+            work += self.work_from_target(target)
         return work
 
     @with_lock
     def get_chainwork(self, height=None) -> int:
+        global _chainwork_cache_dirty
         if height is None:
             height = max(0, self.height())
         if constants.net.TESTNET:
             # On testnet/regtest, difficulty works somewhat different.
             # It's out of scope to properly implement that.
             return height
-        
+
+        # The hash of a block commits to all headers below it, so it fully
+        # determines the chain work up to it. Most calls ask for the same tip
+        # again (e.g. when comparing chains), so remember the last answer.
+        try:
+            block_hash = self.get_hash(height)
+        except MissingHeader:
+            block_hash = None
+        if block_hash is not None and self._last_chainwork[0] == block_hash:
+            return self._last_chainwork[1]
+
         last_retarget = height // 2016 * 2016 - 1
         cached_height = last_retarget
         while _CHAINWORK_CACHE.get(self.get_hash(cached_height)) is None:
@@ -831,19 +1144,19 @@ class Blockchain(Logger):
         assert cached_height >= -1, cached_height
         running_total = _CHAINWORK_CACHE[self.get_hash(cached_height)]
         while cached_height < last_retarget:
-            work_in_chunk = 0
-            for i in range(2016):
-                work_in_chunk += self.chainwork_of_header_at_height(cached_height + i + 1)
+            work_in_chunk = self._chainwork_of_headers(cached_height + 1, 2016)
             cached_height += 2016
             running_total += work_in_chunk
             _CHAINWORK_CACHE[self.get_hash(cached_height)] = running_total
-        
-        work_in_last_partial_chunk = 0
-        for i in range(height - cached_height):
-            work_in_last_partial_chunk += self.chainwork_of_header_at_height(cached_height + i + 1)
-        assert cached_height + i + 1 == height
+            _chainwork_cache_dirty = True
+
+        assert cached_height < height, (cached_height, height)
+        work_in_last_partial_chunk = self._chainwork_of_headers(cached_height + 1, height - cached_height)
 
-        return running_total + work_in_last_partial_chunk
+        chainwork = running_total + work_in_last_partial_chunk
+        if block_hash is not None:
+            self._last_chainwork = (block_hash, chainwork)
+        return chainwork
 
     def can_connect(self, header: dict, check_height: bool=True) -> bool:
         if header is None:
@@ -874,9 +1187,16 @@ class Blockchain(Logger):
         assert start_height >= 0, start_height
         try:
             data = bfh(hexdata)
-            # This is computationally intensive (thanks DGW)
-            self.verify_chunk(start_height, data)
-            self.save_chunk(start_height, data)
+            prev_hash = self.get_hash(start_height - 1)
+            # This is computationally intensive (thanks DGW and PoW hashing),
+            # so keep it off the event loop. verify_chunk takes no lock of its
+            # own, so the chain might change meanwhile; the hash below the
+            # chunk commits to everything it was verified against.
+            await run_in_thread(self.verify_chunk, start_height, data)
+            with self.lock:
+                if self.get_hash(start_height - 1) != prev_hash:
+                    raise Exception('chain changed while verifying chunk')
+                self.save_chunk(start_height, data)
             return True
         except BaseException as e:
             self.logger.info(f'verify_chunk from height {start_height} failed: {repr(e)}')
@@ -897,9 +1217,15 @@ def check_header(header: dict) -> Optional[Blockchain]:
     """Returns any Blockchain that contains header, or None."""
     if type(header) is not dict:
         return None
+    # hash once, not once per chain
+    header_hash = hash_header(header)
+    height = header.get('block_height')
     with blockchains_lock: chains = list(blockchains.values())
+    # Most headers we get asked about are on the best chain, so try it first.
+    # (After a swap it is no longer first in dict order.)
+    chains.sort(key=lambda b: b.parent is not None)
     for b in chains:
-        if b.check_header(header):
+        if b.check_hash(height, header_hash):
             return b
     return None
 
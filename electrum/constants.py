@@ -25,8 +25,9 @@
 
 import os
 import json
+from functools import lru_cache
 
-from typing import NamedTuple, Union
+from typing import NamedTuple, Union, List, Type
 
 # Can't import from util due to circular
 def inv_dict(d):
@@ -35,13 +36,21 @@ def inv_dict(d):
 def read_json(filename, default):
     path = os.path.join(os.path.dirname(__file__), filename)
     try:
-        with open(path, 'r') as f:
+        # json.loads detects the encoding itself; skip the text layer
+        with open(path, 'rb') as f:
             r = json.loads(f.read())
     except:
         r = default
     return r
 
 
+@lru_cache(maxsize=None)
+def _rev_genesis_bytes(genesis: str) -> bytes:
+    # keyed on the hex string, so each network decodes its genesis hash once.
+    # same as bfh(bitcoin.rev_hex(genesis)), without importing bitcoin here
+    return bytes.fromhex(genesis)[::-1]
+
+
 GIT_REPO_URL = "https://github.com/Meowcoin-Foundation/electrum-meowcoin"
 GIT_REPO_ISSUES_URL = "https://github.com/Meowcoin-Foundation/electrum-meowcoin/issues"
 BIP39_WALLET_FORMATS = read_json('bip39_wallet_formats.json', [])
@@ -71,6 +80,34 @@ class BurnAddresses(NamedTuple):
     AddNullQualifierTagBurnAddress: str
     GlobalBurnAddress: str
 
+
+# mainnet and testnet burn the same amounts to the same addresses
+_BURN_AMOUNTS = BurnAmounts(
+    IssueAssetBurnAmount=500,
+    ReissueAssetBurnAmount=100,
+    IssueSubAssetBurnAmount=100,
+    IssueUniqueAssetBurnAmount=5,
+    IssueMsgChannelAssetBurnAmount=100,
+    IssueQualifierAssetBurnAmount=1000,
+    IssueSubQualifierAssetBurnAmount=100,
+    IssueRestrictedAssetBurnAmount=1500,
+    AddNullQualifierTagBurnAmount=0.1
+)
+
+_BURN_ADDRESSES = BurnAddresses(
+    IssueAssetBurnAddress='MCissueAssetXXXXXXXXXXXXXXXXa1oUfD',
+    ReissueAssetBurnAddress='MCReissueAssetXXXXXXXXXXXXXXUdjigq',
+    IssueSubAssetBurnAddress='MCissueSubAssetXXXXXXXXXXXXXbCnNFk',
+    IssueUniqueAssetBurnAddress='MCissueUniqueAssetXXXXXXXXXXSVUgF5',
+    IssueMsgChannelAssetBurnAddress='MCissueMsgChanneLAssetXXXXXXUe6Pvr',
+    IssueQualifierAssetBurnAddress='MCissueQuaLifierXXXXXXXXXXXXWLyvs5',
+    IssueSubQualifierAssetBurnAddress='MCissueSubQuaLifierXXXXXXXXXVHmaXW',
+    IssueRestrictedAssetBurnAddress='MCissueRestrictedXXXXXXXXXXXXfEYLU',
+    AddNullQualifierTagBurnAddress='MCaddTagBurnXXXXXXXXXXXXXXXXUrKr7b',
+    GlobalBurnAddress='MCBurnXXXXXXXXXXXXXXXXXXXXXXUkdzqy'
+)
+
+
 class AbstractNet:
     GENESIS = None
     CHECKPOINTS = None
@@ -91,19 +128,39 @@ class AbstractNet:
     BIP44_COIN_TYPE: int
     LN_REALM_BYTE: int
 
+    # every (transitive) subclass, in definition order
+    _subclasses = []  # type: List[Type[AbstractNet]]
+
+    # (table, height) derived from the checkpoint tables on first use. keyed on
+    # the table object, so assigning a new table recomputes the height; the
+    # tables are never modified in place.
+    _max_legacy_checkpoint = (None, None)
+    _max_checkpoint = (None, None)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        AbstractNet._subclasses.append(cls)
+
     @classmethod
     def max_legacy_checkpoint(cls) -> int:
-        return max(0, len(cls.CHECKPOINTS) * 2016 - 1)
+        table, height = cls._max_legacy_checkpoint
+        if height is None or table is not cls.CHECKPOINTS:
+            height = max(0, len(cls.CHECKPOINTS or []) * 2016 - 1)
+            cls._max_legacy_checkpoint = (cls.CHECKPOINTS, height)
+        return height
 
     @classmethod
     def max_checkpoint(cls) -> int:
-        # DGW Checkpoints start at height 400,000 and are every 2016 blocks after
-        return max(0, cls.DGW_CHECKPOINTS_START + (len(cls.DGW_CHECKPOINTS) * cls.DGW_CHECKPOINTS_SPACING) - 1)
+        table, height = cls._max_checkpoint
+        if height is None or table is not cls.DGW_CHECKPOINTS:
+            # DGW Checkpoints start at height 400,000 and are every 2016 blocks after
+            height = max(0, cls.DGW_CHECKPOINTS_START + (len(cls.DGW_CHECKPOINTS or []) * cls.DGW_CHECKPOINTS_SPACING) - 1)
+            cls._max_checkpoint = (cls.DGW_CHECKPOINTS, height)
+        return height
 
     @classmethod
     def rev_genesis_bytes(cls) -> bytes:
-        from . import bitcoin
-        return bytes.fromhex(bitcoin.rev_hex(cls.GENESIS))
+        return _rev_genesis_bytes(cls.GENESIS)
 
 
 class MeowcoinMainnet(AbstractNet):
@@ -156,30 +213,8 @@ class MeowcoinMainnet(AbstractNet):
     XPUB_HEADERS_INV = inv_dict(XPUB_HEADERS)
     BIP44_COIN_TYPE = 1669
 
-    BURN_AMOUNTS = BurnAmounts(
-        IssueAssetBurnAmount=500,
-        ReissueAssetBurnAmount=100,
-        IssueSubAssetBurnAmount=100,
-        IssueUniqueAssetBurnAmount=5,
-        IssueMsgChannelAssetBurnAmount=100,
-        IssueQualifierAssetBurnAmount=1000,
-        IssueSubQualifierAssetBurnAmount=100,
-        IssueRestrictedAssetBurnAmount=1500,
-        AddNullQualifierTagBurnAmount=0.1
-    )
-
-    BURN_ADDRESSES = BurnAddresses(
-        IssueAssetBurnAddress='MCissueAssetXXXXXXXXXXXXXXXXa1oUfD',
-        ReissueAssetBurnAddress='MCReissueAssetXXXXXXXXXXXXXXUdjigq',
-        IssueSubAssetBurnAddress='MCissueSubAssetXXXXXXXXXXXXXbCnNFk',
-        IssueUniqueAssetBurnAddress='MCissueUniqueAssetXXXXXXXXXXSVUgF5',
-        IssueMsgChannelAssetBurnAddress='MCissueMsgChanneLAssetXXXXXXUe6Pvr',
-        IssueQualifierAssetBurnAddress='MCissueQuaLifierXXXXXXXXXXXXWLyvs5',
-        IssueSubQualifierAssetBurnAddress='MCissueSubQuaLifierXXXXXXXXXVHmaXW',
-        IssueRestrictedAssetBurnAddress='MCissueRestrictedXXXXXXXXXXXXfEYLU',
-        AddNullQualifierTagBurnAddress='MCaddTagBurnXXXXXXXXXXXXXXXXUrKr7b',
-        GlobalBurnAddress='MCBurnXXXXXXXXXXXXXXXXXXXXXXUkdzqy'
-    )
+    BURN_AMOUNTS = _BURN_AMOUNTS
+    BURN_ADDRESSES = _BURN_ADDRESSES
 
 
 class MeowcoinTestnet(AbstractNet):
@@ -233,39 +268,10 @@ class MeowcoinTestnet(AbstractNet):
     }
     XPUB_HEADERS_INV = inv_dict(XPUB_HEADERS)
 
-    BURN_AMOUNTS = BurnAmounts(
-        IssueAssetBurnAmount=500,
-        ReissueAssetBurnAmount=100,
-        IssueSubAssetBurnAmount=100,
-        IssueUniqueAssetBurnAmount=5,
-        IssueMsgChannelAssetBurnAmount=100,
-        IssueQualifierAssetBurnAmount=1000,
-        IssueSubQualifierAssetBurnAmount=100,
-        IssueRestrictedAssetBurnAmount=1500,
-        AddNullQualifierTagBurnAmount=0.1
-    )
-
-    BURN_ADDRESSES = BurnAddresses(
-        IssueAssetBurnAddress='MCissueAssetXXXXXXXXXXXXXXXXa1oUfD',
-        ReissueAssetBurnAddress='MCReissueAssetXXXXXXXXXXXXXXUdjigq',
-        IssueSubAssetBurnAddress='MCissueSubAssetXXXXXXXXXXXXXbCnNFk',
-        IssueUniqueAssetBurnAddress='MCissueUniqueAssetXXXXXXXXXXSVUgF5',
-        IssueMsgChannelAssetBurnAddress='MCissueMsgChanneLAssetXXXXXXUe6Pvr',
-        IssueQualifierAssetBurnAddress='MCissueQuaLifierXXXXXXXXXXXXWLyvs5',
-        IssueSubQualifierAssetBurnAddress='MCissueSubQuaLifierXXXXXXXXXVHmaXW',
-        IssueRestrictedAssetBurnAddress='MCissueRestrictedXXXXXXXXXXXXfEYLU',
-        AddNullQualifierTagBurnAddress='MCaddTagBurnXXXXXXXXXXXXXXXXUrKr7b',
-        GlobalBurnAddress='MCBurnXXXXXXXXXXXXXXXXXXXXXXUkdzqy'
-    )
-
-def all_subclasses(cls):
-    """Return all (transitive) subclasses of cls."""
-    res = set(cls.__subclasses__())
-    for sub in res.copy():
-        res |= all_subclasses(sub)
-    return res
-
-NETS_LIST = tuple(all_subclasses(AbstractNet))
+    BURN_AMOUNTS = _BURN_AMOUNTS
+    BURN_ADDRESSES = _BURN_ADDRESSES
+
+NETS_LIST = tuple(AbstractNet._subclasses)
 
 # don't import net directly, import the module instead (so that net is singleton)
 net = MeowcoinMainnet
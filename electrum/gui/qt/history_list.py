@@ -28,14 +28,16 @@ import sys
 import time
 import datetime
 from datetime import date
-from typing import TYPE_CHECKING, Tuple, Dict, Any
+from typing import TYPE_CHECKING, Tuple, Dict, Any, Optional, List, Callable
 import threading
 import enum
 from decimal import Decimal
 from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
 
 from PyQt5.QtGui import QFont, QBrush, QColor
-from PyQt5.QtCore import (Qt, QPersistentModelIndex, QModelIndex, QAbstractItemModel,
+from PyQt5.QtCore import (Qt, QModelIndex, QAbstractItemModel,
                           QSortFilterProxyModel, QVariant, QItemSelectionModel, QDate, QPoint)
 from PyQt5.QtWidgets import (QMenu, QHeaderView, QLabel, QMessageBox,
                              QPushButton, QComboBox, QVBoxLayout, QCalendarWidget,
@@ -79,19 +81,33 @@ TX_ICONS = [
 ]
 
 
-ROLE_SORT_ORDER = Qt.UserRole + 1000
+FORMAT_CACHE_SIZE = 4096
+
+_RED_BRUSH = QVariant(QBrush(QColor("#BC1E1E")))
+_BLUE_BRUSH = QVariant(QBrush(QColor("#1E1EFF")))
+_ALIGN_RIGHT = QVariant(int(Qt.AlignRight | Qt.AlignVCenter))
+# roles styled the same way in all columns right of DESCRIPTION
+_AMOUNT_COLUMN_STYLE_ROLES = frozenset((Qt.TextAlignmentRole, Qt.FontRole))
+
+
+@lru_cache(maxsize=None)
+def _offcolor_brush(dark_scheme: bool) -> QVariant:
+    # keyed on the scheme, as ColorScheme is only settled once the gui is up
+    return QVariant(QBrush(ColorScheme.LIGHT_GRAY.as_color(True)))
+
+
+@lru_cache(maxsize=None)
+def _monospace_font() -> QVariant:
+    # QFont needs a QGuiApplication, so this cannot be built at import time
+    return QVariant(QFont(MONOSPACE_FONT))
 
 
 class HistorySortModel(QSortFilterProxyModel):
     def lessThan(self, source_left: QModelIndex, source_right: QModelIndex):
-        item1 = self.sourceModel().data(source_left, ROLE_SORT_ORDER)
-        item2 = self.sourceModel().data(source_right, ROLE_SORT_ORDER)
-        if item1 is None or item2 is None:
-            raise Exception(f'UserRole not set for column {source_left.column()}')
-        v1 = item1.value()
-        v2 = item2.value()
-        if v1 is None or isinstance(v1, Decimal) and v1.is_nan(): v1 = -float("inf")
-        if v2 is None or isinstance(v2, Decimal) and v2.is_nan(): v2 = -float("inf")
+        # read the precomputed keys straight off the nodes, instead of going
+        # through sourceModel().data() and a QVariant for every comparison
+        v1 = source_left.internalPointer().get_sort_keys()[source_left.column()]
+        v2 = source_right.internalPointer().get_sort_keys()[source_right.column()]
         try:
             return v1 < v2
         except Exception:
@@ -105,152 +121,226 @@ class HistoryNode(CustomNode):
 
     model: 'HistoryModel'
 
-    def get_data_for_role(self, index: QModelIndex, role: Qt.ItemDataRole) -> QVariant:
+    # icons and tooltips for the STATUS column, shared by all nodes
+    _icon_cache = {}  # type: Dict[Tuple[bool, int], QVariant]
+    _tooltip_cache = {}  # type: Dict[Any, str]
+
+    def __init__(self, model: 'HistoryModel', data):
+        super().__init__(model, data)
+        self._sort_keys = None  # type: Optional[Tuple]
+        self._short_id = None  # type: Optional[str]  # '' if the tx has none
+
+    def get_sort_keys(self) -> Tuple:
+        """Returns the sort key of each column, indexed by HistoryColumns.
+        Computed on first use, as 'balance' and the row are only known
+        once the node has been added to the model.
+        """
+        if self._sort_keys is None:
+            tx_item = self.get_data()
+            is_lightning = tx_item.get('lightning', False)
+            keys = [None] * len(HistoryColumns)
+            # respect sort order of self.transactions (wallet.get_full_history)
+            keys[HistoryColumns.STATUS] = -self.row()
+            keys[HistoryColumns.DESCRIPTION] = tx_item['label'] if 'label' in tx_item else None
+            keys[HistoryColumns.ASSET] = tx_item.get('asset', '')
+            keys[HistoryColumns.AMOUNT] = \
+                (tx_item['bc_value'].value if 'bc_value' in tx_item else 0) \
+                + (tx_item['ln_value'].value if 'ln_value' in tx_item else 0)
+            keys[HistoryColumns.BALANCE] = tx_item['balance'].value if 'balance' in tx_item else 0
+            keys[HistoryColumns.FIAT_VALUE] = \
+                tx_item['fiat_value'].value if 'fiat_value' in tx_item else None
+            keys[HistoryColumns.FIAT_ACQ_PRICE] = \
+                tx_item['acquisition_price'].value if 'acquisition_price' in tx_item else None
+            keys[HistoryColumns.FIAT_CAP_GAINS] = \
+                tx_item['capital_gain'].value if 'capital_gain' in tx_item else None
+            keys[HistoryColumns.TXID] = tx_item['txid'] if not is_lightning else None
+            keys[HistoryColumns.SHORT_ID] = self.get_short_id() or None
+            for i, v in enumerate(keys):
+                if v is None or isinstance(v, Decimal) and v.is_nan():
+                    keys[i] = -float("inf")
+            self._sort_keys = tuple(keys)
+        return self._sort_keys
+
+    def invalidate_sort_keys(self) -> None:
+        self._sort_keys = None
+        self._short_id = None
+
+    def childCount(self):
+        if self._data is None:  # root node
+            return len(self._children)
+        return len(self._data.get('children', []))
+
+    def child(self, row):
+        # child nodes are only built once the view asks for them,
+        # i.e. when the row gets expanded
+        if self._data is not None and not self._children:
+            for child_item in self._data.get('children', []):
+                self.addChild(HistoryNode(self.model, child_item))
+        return super().child(row)
+
+    def set_data(self, tx_item) -> None:
+        self._data = tx_item
+        self.invalidate_sort_keys()
+        for child, child_item in zip(self._children, tx_item.get('children', [])):
+            child.set_data(child_item)
+
+    def get_short_id(self) -> str:
+        """Returns the short id of the tx ('' if unknown), computed once
+        per node until its tx_item changes.
+        """
+        if self._short_id is None:
+            tx_item = self.get_data()
+            txpos_in_block = tx_item.get('txpos_in_block')
+            if not tx_item.get('lightning', False) and txpos_in_block is not None and txpos_in_block >= 0:
+                self._short_id = f"{tx_item['height']}x{txpos_in_block}"
+            else:
+                self._short_id = ''
+        return self._short_id
+
+    def _get_status(self, tx_item) -> Tuple[int, str]:
+        if tx_item.get('lightning', False):
+            timestamp = tx_item['timestamp']
+            return 0, 'unconfirmed' if timestamp is None else format_time(int(timestamp))
+        tx_hash = tx_item['txid']
+        status = self.model.tx_status_cache.get(tx_hash)
+        if status is None:
+            # not cached yet, e.g. while the rows of a refresh are being inserted
+            tx_mined_info = self.model._tx_mined_info_from_tx_item(tx_item)
+            status = self.model.window.wallet.get_tx_status(tx_hash, tx_mined_info)
+        return status
+
+    def get_data_for_role(self, index: QModelIndex, role: Qt.ItemDataRole) -> Any:
         # note: this method is performance-critical.
         # it is called a lot, and so must run extremely fast.
+        # note: plain python values (str, None) are returned where possible,
+        #       PyQt converts those itself, without an extra QVariant per call.
         assert index.isValid()
         col = index.column()
-        window = self.model.window
         tx_item = self.get_data()
-        is_lightning = tx_item.get('lightning', False)
-        timestamp = tx_item['timestamp']
-        short_id = None
-        if is_lightning:
-            status = 0
-            if timestamp is None:
-                status_str = 'unconfirmed'
-            else:
-                status_str = format_time(int(timestamp))
-        else:
-            tx_hash = tx_item['txid']
-            txpos_in_block = tx_item.get('txpos_in_block')
-            if txpos_in_block is not None and txpos_in_block >= 0:
-                short_id = f"{tx_item['height']}x{txpos_in_block}"
-            conf = tx_item['confirmations']
-            try:
-                status, status_str = self.model.tx_status_cache[tx_hash]
-            except KeyError:
-                tx_mined_info = self.model._tx_mined_info_from_tx_item(tx_item)
-                status, status_str = window.wallet.get_tx_status(tx_hash, tx_mined_info)
-
-        if role == ROLE_SORT_ORDER:
-            d = {
-                HistoryColumns.STATUS:
-                    # respect sort order of self.transactions (wallet.get_full_history)
-                    -index.row(),
-                HistoryColumns.DESCRIPTION:
-                    tx_item['label'] if 'label' in tx_item else None,
-                HistoryColumns.ASSET:
-                    tx_item.get('asset', ''),
-                HistoryColumns.AMOUNT:
-                    (tx_item['bc_value'].value if 'bc_value' in tx_item else 0)\
-                    + (tx_item['ln_value'].value if 'ln_value' in tx_item else 0),
-                HistoryColumns.BALANCE:
-                    (tx_item['balance'].value if 'balance' in tx_item else 0),
-                HistoryColumns.FIAT_VALUE:
-                    tx_item['fiat_value'].value if 'fiat_value' in tx_item else None,
-                HistoryColumns.FIAT_ACQ_PRICE:
-                    tx_item['acquisition_price'].value if 'acquisition_price' in tx_item else None,
-                HistoryColumns.FIAT_CAP_GAINS:
-                    tx_item['capital_gain'].value if 'capital_gain' in tx_item else None,
-                HistoryColumns.TXID: tx_hash if not is_lightning else None,
-                HistoryColumns.SHORT_ID: short_id,
-            }
-            return QVariant(d[col])
+
+        if role in (Qt.DisplayRole, Qt.EditRole, MyTreeView.ROLE_CLIPBOARD_DATA):
+            handler = self._display_handlers.get(col)
+            if handler is None:
+                return None
+            if role == MyTreeView.ROLE_CLIPBOARD_DATA:
+                return handler(self, tx_item, False, False)
+            return handler(self, tx_item, True, None)
         if role == Qt.BackgroundRole:
             color = tx_item.get('offcolor', False)
             if not color: return
-            offcolor_brush = QBrush(ColorScheme.LIGHT_GRAY.as_color(True))
-            return QVariant(offcolor_brush)
+            return _offcolor_brush(ColorScheme.dark_scheme)
         if role == MyTreeView.ROLE_EDIT_KEY:
-            return QVariant(get_item_key(tx_item))
-        if role not in (Qt.DisplayRole, Qt.EditRole, MyTreeView.ROLE_CLIPBOARD_DATA):
-            if col == HistoryColumns.STATUS and role == Qt.DecorationRole:
-                if tx_item.get('hide_status', False):
-                    return QVariant()
-                icon = "lightning" if is_lightning else TX_ICONS[status]
-                return QVariant(read_QIcon(icon))
-            elif col == HistoryColumns.STATUS and role == Qt.ToolTipRole:
+            return get_item_key(tx_item)
+        is_lightning = tx_item.get('lightning', False)
+        if col == HistoryColumns.STATUS and role == Qt.DecorationRole:
+            if tx_item.get('hide_status', False):
+                return None
+            status, status_str = self._get_status(tx_item)
+            key = (is_lightning, status)
+            icon = self._icon_cache.get(key)
+            if icon is None:
+                icon = QVariant(read_QIcon("lightning" if is_lightning else TX_ICONS[status]))
+                self._icon_cache[key] = icon
+            return icon
+        elif col == HistoryColumns.STATUS and role == Qt.ToolTipRole:
+            if is_lightning:
+                key = 'lightning'
+            elif tx_item['height'] == TX_HEIGHT_LOCAL:
+                key = TX_HEIGHT_LOCAL
+            else:
+                conf = tx_item['confirmations']
+                key = ('conf', conf)
+            msg = self._tooltip_cache.get(key)
+            if msg is None:
                 if is_lightning:
                     msg = 'lightning transaction'
-                else:  # on-chain
-                    if tx_item['height'] == TX_HEIGHT_LOCAL:
-                        # note: should we also explain double-spends?
-                        msg = _("This transaction is only available on your local machine.\n"
-                                "The currently connected server does not know about it.\n"
-                                "You can either broadcast it now, or simply remove it.")
-                    else:
-                        msg = str(conf) + _(" confirmation" + ("s" if conf != 1 else ""))
-                return QVariant(msg)
-            elif col == HistoryColumns.ASSET and role == Qt.ToolTipRole:
-                asset = tx_item.get('asset', '')
-                return QVariant(asset)
-            elif col > HistoryColumns.DESCRIPTION and role == Qt.TextAlignmentRole:
-                return QVariant(int(Qt.AlignRight | Qt.AlignVCenter))
-            elif col > HistoryColumns.DESCRIPTION and role == Qt.FontRole:
-                monospace_font = QFont(MONOSPACE_FONT)
-                return QVariant(monospace_font)
-            #elif col == HistoryColumns.DESCRIPTION and role == Qt.DecorationRole and not is_lightning\
-            #        and self.parent.wallet.invoices.paid.get(tx_hash):
-            #    return QVariant(read_QIcon("seal"))
-            elif col in (HistoryColumns.DESCRIPTION, HistoryColumns.AMOUNT) \
-                    and role == Qt.ForegroundRole and tx_item['value'].value < 0:
-                red_brush = QBrush(QColor("#BC1E1E"))
-                return QVariant(red_brush)
-            elif col == HistoryColumns.FIAT_VALUE and role == Qt.ForegroundRole \
-                    and not tx_item.get('fiat_default') and tx_item.get('fiat_value') is not None:
-                blue_brush = QBrush(QColor("#1E1EFF"))
-                return QVariant(blue_brush)
-            return QVariant()
-
-        add_thousands_sep = None
-        whitespaces = True
-        if role == MyTreeView.ROLE_CLIPBOARD_DATA:
-            add_thousands_sep = False
-            whitespaces = False
-
-        if col == HistoryColumns.STATUS:
-            if tx_item.get('hide_status', False):
-                return QVariant('')
-            return QVariant(status_str)
-        elif col == HistoryColumns.DESCRIPTION and 'label' in tx_item:
-            if tx_item.get('hide_status', False):
-                return QVariant()
-            return QVariant(tx_item['label'])
-        elif col == HistoryColumns.AMOUNT:
-            bc_value = tx_item['bc_value'].value if 'bc_value' in tx_item else 0
-            ln_value = tx_item['ln_value'].value if 'ln_value' in tx_item else 0
-            value = bc_value + ln_value
-            v_str = window.format_amount(value, is_diff=True, whitespaces=whitespaces, add_thousands_sep=add_thousands_sep)
-            return QVariant(v_str)
-        elif col == HistoryColumns.ASSET:
-            if asset := tx_item.get('asset'):
-                if asset[-1] != ASSET_OWNER_IDENTIFIER:
-                    asset += ' '
-                #if len(asset) > 13:
-                #    asset = asset[:6] + '…' + asset[-6:]
-                return QVariant(asset)
-            return QVariant('')
-        elif col == HistoryColumns.BALANCE:
-            balance = tx_item['balance'].value if 'balance' in tx_item else None
-            balance_str = window.format_amount(balance, whitespaces=whitespaces, add_thousands_sep=add_thousands_sep) if balance is not None else ''
-            return QVariant(balance_str)
-        elif col == HistoryColumns.FIAT_VALUE and 'fiat_value' in tx_item:
-            value_str = window.fx.format_fiat(tx_item['fiat_value'].value, add_thousands_sep=add_thousands_sep)
-            return QVariant(value_str)
-        elif col == HistoryColumns.FIAT_ACQ_PRICE and \
-                tx_item['value'].value < 0 and 'acquisition_price' in tx_item:
-            # fixme: should use is_mine
-            acq = tx_item['acquisition_price'].value
-            return QVariant(window.fx.format_fiat(acq, add_thousands_sep=add_thousands_sep))
-        elif col == HistoryColumns.FIAT_CAP_GAINS and 'capital_gain' in tx_item:
-            cg = tx_item['capital_gain'].value
-            return QVariant(window.fx.format_fiat(cg, add_thousands_sep=add_thousands_sep))
-        elif col == HistoryColumns.TXID:
-            return QVariant(tx_hash) if not is_lightning else QVariant('')
-        elif col == HistoryColumns.SHORT_ID:
-            return QVariant(short_id or "")
-        return QVariant()
+                elif tx_item['height'] == TX_HEIGHT_LOCAL:
+                    # note: should we also explain double-spends?
+                    msg = _("This transaction is only available on your local machine.\n"
+                            "The currently connected server does not know about it.\n"
+                            "You can either broadcast it now, or simply remove it.")
+                else:
+                    msg = str(conf) + _(" confirmation" + ("s" if conf != 1 else ""))
+                self._tooltip_cache[key] = msg
+            return msg
+        elif col == HistoryColumns.ASSET and role == Qt.ToolTipRole:
+            asset = tx_item.get('asset', '')
+            return asset
+        elif role in _AMOUNT_COLUMN_STYLE_ROLES and col > HistoryColumns.DESCRIPTION:
+            return _ALIGN_RIGHT if role == Qt.TextAlignmentRole else _monospace_font()
+        #elif col == HistoryColumns.DESCRIPTION and role == Qt.DecorationRole and not is_lightning\
+        #        and self.parent.wallet.invoices.paid.get(tx_hash):
+        #    return QVariant(read_QIcon("seal"))
+        elif col in (HistoryColumns.DESCRIPTION, HistoryColumns.AMOUNT) \
+                and role == Qt.ForegroundRole and tx_item['value'].value < 0:
+            return _RED_BRUSH
+        elif col == HistoryColumns.FIAT_VALUE and role == Qt.ForegroundRole \
+                and not tx_item.get('fiat_default') and tx_item.get('fiat_value') is not None:
+            return _BLUE_BRUSH
+        return None
+
+    # DisplayRole handlers, one per column, dispatched through _display_handlers.
+    # they all take (self, tx_item, whitespaces, add_thousands_sep)
+
+    def _render_status(self, tx_item, whitespaces, add_thousands_sep):
+        if tx_item.get('hide_status', False):
+            return ''
+        status, status_str = self._get_status(tx_item)
+        return status_str
+
+    def _render_description(self, tx_item, whitespaces, add_thousands_sep):
+        if 'label' not in tx_item or tx_item.get('hide_status', False):
+            return None
+        return tx_item['label']
+
+    def _render_asset(self, tx_item, whitespaces, add_thousands_sep):
+        if asset := tx_item.get('asset'):
+            if asset[-1] != ASSET_OWNER_IDENTIFIER:
+                asset += ' '
+            #if len(asset) > 13:
+            #    asset = asset[:6] + '…' + asset[-6:]
+            return asset
+        return ''
+
+    def _render_amount(self, tx_item, whitespaces, add_thousands_sep):
+        bc_value = tx_item['bc_value'].value if 'bc_value' in tx_item else 0
+        ln_value = tx_item['ln_value'].value if 'ln_value' in tx_item else 0
+        value = bc_value + ln_value
+        v_str = self.model.format_amount(value, is_diff=True, whitespaces=whitespaces, add_thousands_sep=add_thousands_sep)
+        return v_str
+
+    def _render_balance(self, tx_item, whitespaces, add_thousands_sep):
+        balance = tx_item['balance'].value if 'balance' in tx_item else None
+        balance_str = self.model.format_amount(balance, whitespaces=whitespaces, add_thousands_sep=add_thousands_sep) if balance is not None else ''
+        return balance_str
+
+    def _render_fiat_value(self, tx_item, whitespaces, add_thousands_sep):
+        if 'fiat_value' not in tx_item:
+            return None
+        value_str = self.model.format_fiat(tx_item['fiat_value'].value, add_thousands_sep=add_thousands_sep)
+        return value_str
+
+    def _render_fiat_acq_price(self, tx_item, whitespaces, add_thousands_sep):
+        # fixme: should use is_mine
+        if tx_item['value'].value >= 0 or 'acquisition_price' not in tx_item:
+            return None
+        acq = tx_item['acquisition_price'].value
+        return self.model.format_fiat(acq, add_thousands_sep=add_thousands_sep)
+
+    def _render_fiat_cap_gains(self, tx_item, whitespaces, add_thousands_sep):
+        if 'capital_gain' not in tx_item:
+            return None
+        cg = tx_item['capital_gain'].value
+        return self.model.format_fiat(cg, add_thousands_sep=add_thousands_sep)
+
+    def _render_txid(self, tx_item, whitespaces, add_thousands_sep):
+        return tx_item['txid'] if not tx_item.get('lightning', False) else ''
+
+    def _render_short_id(self, tx_item, whitespaces, add_thousands_sep):
+        return self.get_short_id()
+
+    # filled in at the bottom of the module, once HistoryColumns exists
+    _display_handlers = {}  # type: Dict[int, Callable[..., Optional[str]]]
 
 
 class HistoryModel(CustomModel, Logger):
@@ -262,6 +352,44 @@ class HistoryModel(CustomModel, Logger):
         self.view = None  # type: HistoryList
         self.transactions = OrderedDictWithIndex()
         self.tx_status_cache = {}  # type: Dict[str, Tuple[int, str]]
+        self._tx_status_mined_infos = {}  # type: Dict[str, TxMinedInfo]
+        self._rows_by_txid = {}  # type: Dict[str, List[int]]
+        # rows from here on were unconfirmed as of the last refresh. the rows
+        # before it got their position from a confirmed sort key.
+        self._unconfirmed_tail_start = 0
+        # whether any row has children. if not, the model is a flat list,
+        # and index/parent/hasChildren can skip the generic tree walk.
+        self._has_children = False
+        # should_show_fiat(), as of the last set_visibility_of_columns.
+        # headerData reads this, instead of going through fx and the config
+        # every time Qt repaints the header.
+        self._show_fiat = False
+        self._header_titles = None  # type: Optional[Dict[int, str]]
+        # formatted amounts, see format_amount and format_fiat
+        self._format_cache = {}  # type: Dict[Tuple, str]
+        self._format_cache_state = None
+
+    def index(self, row, column, _parent=None):
+        if self._has_children:
+            return super().index(row, column, _parent)
+        if _parent is not None and _parent.isValid():
+            return QModelIndex()
+        children = self._root._children
+        if not (0 <= row < len(children) and 0 <= column < self._columncount):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index):
+        if self._has_children:
+            return super().parent(index)
+        return QModelIndex()
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self._root._children)
+        if not self._has_children:
+            return False
+        return parent.internalPointer().childCount() > 0
 
     def set_view(self, history_list: 'HistoryList'):
         # FIXME HistoryModel and HistoryList mutually depend on each other.
@@ -270,8 +398,10 @@ class HistoryModel(CustomModel, Logger):
         self.set_visibility_of_columns()
 
     def update_label(self, index):
-        tx_item = index.internalPointer().get_data()
+        node = index.internalPointer()
+        tx_item = node.get_data()
         tx_item['label'] = self.window.wallet.get_label_for_txid(get_item_key(tx_item))
+        node.invalidate_sort_keys()
         topLeft = bottomRight = self.createIndex(index.row(), HistoryColumns.DESCRIPTION)
         self.dataChanged.emit(topLeft, bottomRight, [Qt.DisplayRole])
         self.window.utxo_list.update()
@@ -292,8 +422,11 @@ class HistoryModel(CustomModel, Logger):
             return False
         return fx.has_history()
 
-    def should_show_capital_gains(self):
-        return self.should_show_fiat() and self.window.config.FX_HISTORY_RATES_CAPITAL_GAINS
+    def should_show_capital_gains(self, show_fiat: bool = None):
+        """show_fiat: the result of should_show_fiat(), if already known"""
+        if show_fiat is None:
+            show_fiat = self.should_show_fiat()
+        return show_fiat and self.window.config.FX_HISTORY_RATES_CAPITAL_GAINS
 
     @profiler
     def refresh(self, reason: str):
@@ -316,44 +449,69 @@ class HistoryModel(CustomModel, Logger):
             include_lightning=self.should_include_lightning_payments(),
             include_fiat=self.should_show_fiat(),
         )
-        
-        if transactions == self.transactions:
+        # compute the running balance up front, so that unchanged
+        # rows compare equal to the ones in self.transactions
+        balance = defaultdict(int)
+        for tx_item in transactions.values():
+            asset = tx_item.get('asset', None)
+            balance[asset] += tx_item['value'].value
+            tx_item['balance'] = Satoshis(balance[asset])
+
+        has_children = any(tx_item.get('children') for tx_item in transactions.values())
+        if has_children:
+            # the generic tree paths are also correct for flat rows
+            self._has_children = True
+        # the rows up to the first differing key are kept, and only updated in
+        # place where their contents changed (e.g. confirmations or labels).
+        # the rest of the old rows is removed and the new tail inserted, so a
+        # new tx, or a tx that got mined and moved up, only touches the
+        # unconfirmed rows at the end, instead of rebuilding the whole model.
+        # note: each kept row is compared once here, rather than comparing
+        #       the whole history up front and then touching every node anyway.
+        old_length = len(self.transactions)
+        keep = self._get_common_prefix_length(transactions)
+        changed_rows = []
+        for node, (key, tx_item) in zip(islice(self._root._children, keep), transactions.items()):
+            if node.get_data() != tx_item:
+                node.set_data(tx_item)
+                changed_rows.append(node.row())
+            else:
+                # keep sharing the dict with the node, as in-place updates
+                # (labels, mined status) go through the node
+                transactions[key] = node.get_data()
+        if not changed_rows and keep == old_length == len(transactions):
             return
-
-        #for transaction in transactions.values():
-        #    print(transaction['txid'])
-        #    print(transaction['asset'])
-        #    print(transaction['bc_value'])
-        #    print('==========')
-        
-        old_length = self._root.childCount()
-        if old_length != 0:
-            self.beginRemoveRows(QModelIndex(), 0, old_length)
-            self.transactions.clear()
-            self._root = HistoryNode(self, None)
+        self._emit_rows_changed(changed_rows, 0, len(HistoryColumns) - 1)
+        if keep < old_length:
+            self.beginRemoveRows(QModelIndex(), keep, old_length - 1)
+            del self._root._children[keep:]
             self.endRemoveRows()
-        parents = {}
-        for tx_item in transactions.values():
-            node = HistoryNode(self, tx_item)
-            self._root.addChild(node)
-            for child_item in tx_item.get('children', []):
-                child_node = HistoryNode(self, child_item)
-                # add child to parent
-                node.addChild(child_node)
-
-        # compute balance once all children have beed added
-        balance = defaultdict(int)
-        for node in self._root._children:
-            asset = node._data.get('asset', None)
-            sats = node._data['value']
-            balance[asset] += sats.value
-            node._data['balance'] = Satoshis(balance[asset])
-
-        new_length = self._root.childCount()
-        self.beginInsertRows(QModelIndex(), 0, new_length-1)
+        self._has_children = has_children
         self.transactions = transactions
-        self.endInsertRows()
-
+        if keep < len(transactions):
+            self.beginInsertRows(QModelIndex(), keep, len(transactions) - 1)
+            for tx_item in islice(transactions.values(), keep, None):
+                self._add_node(tx_item)
+            self.endInsertRows()
+        self._after_refresh(selected_row)
+
+    def _add_node(self, tx_item) -> None:
+        # note: the children of the node are added lazily, see HistoryNode.child
+        self._root.addChild(HistoryNode(self, tx_item))
+
+    def _get_common_prefix_length(self, transactions: OrderedDictWithIndex) -> int:
+        """Returns the number of leading rows of transactions that have the
+        same keys, in the same order, and the same number of children as
+        the current rows. Those rows can be kept and updated in place.
+        """
+        keep = 0
+        for node, old_key, (key, tx_item) in zip(self._root._children, self.transactions.keys(), transactions.items()):
+            if key != old_key or len(tx_item.get('children', [])) != node.childCount():
+                break
+            keep += 1
+        return keep
+
+    def _after_refresh(self, selected_row):
         if selected_row:
             self.view.selectionModel().select(self.createIndex(selected_row, 0), QItemSelectionModel.Rows | QItemSelectionModel.SelectCurrent)
         self.view.filter()
@@ -367,15 +525,35 @@ class HistoryModel(CustomModel, Logger):
             self.view.years = [str(i) for i in range(start_date.year, end_date.year + 1)]
             self.view.period_combo.insertItems(1, self.view.years)
         # update tx_status_cache
-        self.tx_status_cache.clear()
-        for (txid, asset), tx_item in self.transactions.items():
-            if not tx_item.get('lightning', False):
-                tx_mined_info = self._tx_mined_info_from_tx_item(tx_item)
-                self.tx_status_cache[(txid, asset)] = self.window.wallet.get_tx_status(txid, tx_mined_info)
+        # note: the status only depends on the txid, not on the asset, and
+        #       a confirmed tx keeps its status for as long as its mined info
+        #       is unchanged. unconfirmed txs also depend on the mempool, so
+        #       they are always recomputed.
+        old_status_cache = self.tx_status_cache
+        old_mined_infos = self._tx_status_mined_infos
+        self.tx_status_cache = {}
+        self._tx_status_mined_infos = {}
+        self._rows_by_txid = defaultdict(list)
+        self._unconfirmed_tail_start = 0
+        for row, tx_item in enumerate(self.transactions.values()):
+            if not tx_item.get('lightning', False) and (tx_item.get('confirmations') or 0) > 0:
+                self._unconfirmed_tail_start = row + 1
+            txid = tx_item['txid']
+            rows = self._rows_by_txid[txid]
+            rows.append(row)
+            if len(rows) > 1:
+                continue
+            if tx_item.get('lightning', False):
+                continue
+            tx_mined_info = self._tx_mined_info_from_tx_item(tx_item)
+            if tx_mined_info.conf and old_mined_infos.get(txid) == tx_mined_info:
+                self.tx_status_cache[txid] = old_status_cache[txid]
+            else:
+                self.tx_status_cache[txid] = self.window.wallet.get_tx_status(txid, tx_mined_info)
+            self._tx_status_mined_infos[txid] = tx_mined_info
         # update counter
-        num_tx = len(set(v['txid'] for v in self.transactions.values()))
         if self.view:
-            self.view.num_tx_label.setText(_("{} transactions").format(num_tx))
+            self.view.num_tx_label.setText(_("{} transactions").format(len(self._rows_by_txid)))
 
     def set_visibility_of_columns(self):
         def set_visible(col: int, b: bool):
@@ -384,58 +562,116 @@ class HistoryModel(CustomModel, Logger):
         set_visible(HistoryColumns.TXID, False)
         set_visible(HistoryColumns.SHORT_ID, False)
         # fiat
-        history = self.should_show_fiat()
-        cap_gains = self.should_show_capital_gains()
+        history = self._show_fiat = self.should_show_fiat()
+        self._header_titles = None  # fiat titles depend on fx.ccy
+        cap_gains = self.should_show_capital_gains(history)
         set_visible(HistoryColumns.FIAT_VALUE, history)
         set_visible(HistoryColumns.FIAT_ACQ_PRICE, history and cap_gains)
         set_visible(HistoryColumns.FIAT_CAP_GAINS, history and cap_gains)
 
     def update_fiat(self, idx):
-        tx_item = idx.internalPointer().get_data()
+        node = idx.internalPointer()
+        tx_item = node.get_data()
         txid = tx_item['txid']
         fee = tx_item.get('fee')
         value = tx_item['value'].value
         fiat_fields = self.window.wallet.get_tx_item_fiat(
             tx_hash=txid, amount_sat=value, fx=self.window.fx, tx_fee=fee.value if fee else None)
         tx_item.update(fiat_fields)
-        self.dataChanged.emit(idx, idx, [Qt.DisplayRole, Qt.ForegroundRole])
+        node.invalidate_sort_keys()
+        # the acquisition price and capital gains follow from the fiat value
+        self.dataChanged.emit(
+            self.createIndex(idx.row(), HistoryColumns.FIAT_VALUE, node),
+            self.createIndex(idx.row(), HistoryColumns.FIAT_CAP_GAINS, node),
+            [Qt.DisplayRole, Qt.ForegroundRole])
 
     def update_tx_mined_status(self, tx_hash: str, tx_mined_info: TxMinedInfo):
-        try:
-            row = self.transactions.pos_from_key(tx_hash)
-            tx_item = self.transactions[tx_hash]
-        except KeyError:
-            return
+        rows = self._set_tx_mined_info(tx_hash, tx_mined_info)
+        self._emit_mined_status_changed(rows)
+
+    def _set_tx_mined_info(self, tx_hash: str, tx_mined_info: TxMinedInfo) -> List[int]:
+        """Updates the rows of tx_hash without notifying the view.
+        Returns the affected rows.
+        """
+        rows = self._rows_by_txid.get(tx_hash)
+        if not rows:
+            return []
         self.tx_status_cache[tx_hash] = self.window.wallet.get_tx_status(tx_hash, tx_mined_info)
-        tx_item.update({
-            'confirmations':  tx_mined_info.conf,
-            'timestamp':      tx_mined_info.timestamp,
-            'txpos_in_block': tx_mined_info.txpos,
-            'date':           timestamp_to_datetime(tx_mined_info.timestamp),
-        })
-        topLeft = self.createIndex(row, 0)
-        bottomRight = self.createIndex(row, len(HistoryColumns) - 1)
-        self.dataChanged.emit(topLeft, bottomRight)
+        self._tx_status_mined_infos.pop(tx_hash, None)
+        for row in rows:
+            node = self._root.child(row)
+            node.get_data().update({
+                'height':         tx_mined_info.height,
+                'wanted_height':  tx_mined_info.wanted_height,
+                'confirmations':  tx_mined_info.conf,
+                'timestamp':      tx_mined_info.timestamp,
+                'txpos_in_block': tx_mined_info.txpos,
+                'date':           timestamp_to_datetime(tx_mined_info.timestamp),
+            })
+            node.invalidate_sort_keys()
+        return rows
+
+    def _emit_mined_status_changed(self, rows: List[int]):
+        # only the status and short id cells depend on the mined info
+        self._emit_rows_changed(rows, HistoryColumns.STATUS, HistoryColumns.STATUS,
+                                [Qt.DisplayRole, Qt.DecorationRole, Qt.ToolTipRole])
+        self._emit_rows_changed(rows, HistoryColumns.SHORT_ID, HistoryColumns.SHORT_ID,
+                                [Qt.DisplayRole])
+
+    def _emit_rows_changed(self, rows: List[int], first_col: int, last_col: int, roles: List[int] = None):
+        """Emits dataChanged for the given sorted top-level rows,
+        one rectangle per run of consecutive rows.
+        No roles means that all roles may have changed.
+        """
+        if not rows:
+            return
+        start = prev = rows[0]
+        for row in rows[1:] + [None]:
+            if row == prev + 1:
+                prev = row
+                continue
+            self.dataChanged.emit(
+                self.createIndex(start, first_col, self._root.child(start)),
+                self.createIndex(prev, last_col, self._root.child(prev)),
+                roles or [])
+            start = prev = row
 
     def on_fee_histogram(self):
-        for (tx_hash, asset), tx_item in list(self.transactions.items()):
+        # note: get_full_history sorts by monotonic timestamp, which is
+        #       TX_TIMESTAMP_INF for all unconfirmed txs, so they are the
+        #       last rows. walk backwards and stop once past the rows that
+        #       were unconfirmed as of the last refresh. txs that got mined
+        #       since then keep their row until the next refresh, so they
+        #       are skipped rather than taken as the end of the tail.
+        changed_rows = []
+        for tx_hash, rows in reversed(self._rows_by_txid.items()):
+            if rows[0] < self._unconfirmed_tail_start:
+                break
+            tx_item = self._root.child(rows[0]).get_data()
             if tx_item.get('lightning'):
                 continue
             tx_mined_info = self._tx_mined_info_from_tx_item(tx_item)
             if tx_mined_info.conf > 0:
-                # note: we could actually break here if we wanted to rely on the order of txns in self.transactions
                 continue
-            self.update_tx_mined_status(tx_hash, tx_mined_info)
+            changed_rows += self._set_tx_mined_info(tx_hash, tx_mined_info)
+        # the unconfirmed rows are contiguous, so this is usually
+        # a single dataChanged per column
+        self._emit_mined_status_changed(sorted(changed_rows))
 
     def headerData(self, section: int, orientation: Qt.Orientation, role: Qt.ItemDataRole):
         assert orientation == Qt.Horizontal
         if role != Qt.DisplayRole:
             return None
+        if self._header_titles is None:
+            self._header_titles = self._get_header_titles()
+        return self._header_titles[section]
+
+    def _get_header_titles(self) -> Dict[int, str]:
         fx = self.window.fx
         fiat_title = 'n/a fiat value'
         fiat_acq_title = 'n/a fiat acquisition price'
         fiat_cg_title = 'n/a fiat capital gains'
-        if self.should_show_fiat():
+        if self._show_fiat:
             fiat_title = '%s '%fx.ccy + _('Value')
             fiat_acq_title = '%s '%fx.ccy + _('Acquisition price')
             fiat_cg_title =  '%s '%fx.ccy + _('Capital Gains')
@@ -450,7 +686,7 @@ class HistoryModel(CustomModel, Logger):
             HistoryColumns.FIAT_CAP_GAINS: fiat_cg_title,
             HistoryColumns.TXID: 'TXID',
             HistoryColumns.SHORT_ID: 'Short ID',
-        }[section]
+        }
 
     def flags(self, idx: QModelIndex) -> int:
         extra_flags = Qt.NoItemFlags  # type: Qt.ItemFlag
@@ -458,6 +694,42 @@ class HistoryModel(CustomModel, Logger):
             extra_flags |= Qt.ItemIsEditable
         return super().flags(idx) | int(extra_flags)
 
+    def _get_format_cache(self) -> Dict[Tuple, str]:
+        # the cached strings depend on these settings: drop them if any changed
+        config = self.window.config
+        fx = self.window.fx
+        state = (config.decimal_point, config.num_zeros, config.amt_precision_post_satoshi,
+                 config.amt_add_thousands_sep, fx.ccy if fx else None)
+        if state != self._format_cache_state or len(self._format_cache) > FORMAT_CACHE_SIZE:
+            self._format_cache.clear()
+            self._format_cache_state = state
+        return self._format_cache
+
+    def format_amount(self, amount_sat, *, is_diff=False, whitespaces=False, add_thousands_sep: bool = None) -> str:
+        """Like window.format_amount, but memoized.
+        The same few amounts get formatted over and over again when repainting.
+        """
+        cache = self._get_format_cache()
+        key = ('amount', amount_sat, is_diff, whitespaces, add_thousands_sep)
+        text = cache.get(key)
+        if text is None:
+            text = self.window.format_amount(
+                amount_sat, is_diff=is_diff, whitespaces=whitespaces, add_thousands_sep=add_thousands_sep)
+            cache[key] = text
+        return text
+
+    def format_fiat(self, value: Decimal, *, add_thousands_sep: bool = None) -> str:
+        """Like window.fx.format_fiat, but memoized."""
+        if value.is_nan():  # NaN never compares equal, so it would never hit the cache
+            return self.window.fx.format_fiat(value, add_thousands_sep=add_thousands_sep)
+        cache = self._get_format_cache()
+        key = ('fiat', value, add_thousands_sep)
+        text = cache.get(key)
+        if text is None:
+            text = self.window.fx.format_fiat(value, add_thousands_sep=add_thousands_sep)
+            cache[key] = text
+        return text
+
     @staticmethod
     def _tx_mined_info_from_tx_item(tx_item: Dict[str, Any]) -> TxMinedInfo:
         # FIXME a bit hackish to have to reconstruct the TxMinedInfo... same thing in qml-gui
@@ -644,8 +916,10 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
         flow = summary['flow']
         start_date = start.get('date')
         end_date = end.get('date')
-        format_amount = lambda x: self.main_window.format_amount(x.value) + ' ' + self.main_window.base_unit()
-        format_fiat = lambda x: str(x) + ' ' + self.main_window.fx.ccy
+        base_unit = self.main_window.base_unit()
+        ccy = fx.ccy
+        format_amount = lambda x: self.main_window.format_amount(x.value) + ' ' + base_unit
+        format_fiat = lambda x: str(x) + ' ' + ccy
 
         d = WindowModalDialog(self, _("Summary"))
         d.setMinimumSize(600, 150)
@@ -655,43 +929,30 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
         grid = QGridLayout()
         grid.addWidget(QLabel(_("Begin")), 0, 1)
         grid.addWidget(QLabel(_("End")), 0, 2)
-        #
-        grid.addWidget(QLabel(_("Date")), 1, 0)
-        grid.addWidget(QLabel(self.format_date(start_date)), 1, 1)
-        grid.addWidget(QLabel(self.format_date(end_date)), 1, 2)
-        #
-        grid.addWidget(QLabel(_("BTC balance")), 2, 0)
-        grid.addWidget(QLabel(format_amount(start['BTC_balance'])), 2, 1)
-        grid.addWidget(QLabel(format_amount(end['BTC_balance'])), 2, 2)
-        #
-        grid.addWidget(QLabel(_("BTC Fiat price")), 3, 0)
-        grid.addWidget(QLabel(format_fiat(start.get('BTC_fiat_price'))), 3, 1)
-        grid.addWidget(QLabel(format_fiat(end.get('BTC_fiat_price'))), 3, 2)
-        #
-        grid.addWidget(QLabel(_("Fiat balance")), 4, 0)
-        grid.addWidget(QLabel(format_fiat(start.get('fiat_balance'))), 4, 1)
-        grid.addWidget(QLabel(format_fiat(end.get('fiat_balance'))), 4, 2)
-        #
-        grid.addWidget(QLabel(_("Acquisition price")), 5, 0)
-        grid.addWidget(QLabel(format_fiat(start.get('acquisition_price', ''))), 5, 1)
-        grid.addWidget(QLabel(format_fiat(end.get('acquisition_price', ''))), 5, 2)
-        #
-        grid.addWidget(QLabel(_("Unrealized capital gains")), 6, 0)
-        grid.addWidget(QLabel(format_fiat(start.get('unrealized_gains', ''))), 6, 1)
-        grid.addWidget(QLabel(format_fiat(end.get('unrealized_gains', ''))), 6, 2)
-        #
+        # (label, begin, end)
+        rows = [
+            (_("Date"), self.format_date(start_date), self.format_date(end_date)),
+            (_("BTC balance"), format_amount(start['BTC_balance']), format_amount(end['BTC_balance'])),
+            (_("BTC Fiat price"), format_fiat(start.get('BTC_fiat_price')), format_fiat(end.get('BTC_fiat_price'))),
+            (_("Fiat balance"), format_fiat(start.get('fiat_balance')), format_fiat(end.get('fiat_balance'))),
+            (_("Acquisition price"), format_fiat(start.get('acquisition_price', '')), format_fiat(end.get('acquisition_price', ''))),
+            (_("Unrealized capital gains"), format_fiat(start.get('unrealized_gains', '')), format_fiat(end.get('unrealized_gains', ''))),
+        ]
+        for i, row in enumerate(rows, start=1):
+            for j, text in enumerate(row):
+                grid.addWidget(QLabel(text), i, j)
+        # (label, value)
+        flow_rows = [
+            (_("BTC incoming"), format_amount(flow['BTC_incoming'])),
+            (_("Fiat incoming"), format_fiat(flow.get('fiat_incoming'))),
+            (_("BTC outgoing"), format_amount(flow['BTC_outgoing'])),
+            (_("Fiat outgoing"), format_fiat(flow.get('fiat_outgoing'))),
+            (_("Realized capital gains"), format_fiat(flow.get('realized_capital_gains'))),
+        ]
         grid2 = QGridLayout()
-        grid2.addWidget(QLabel(_("BTC incoming")), 0, 0)
-        grid2.addWidget(QLabel(format_amount(flow['BTC_incoming'])), 0, 1)
-        grid2.addWidget(QLabel(_("Fiat incoming")), 1, 0)
-        grid2.addWidget(QLabel(format_fiat(flow.get('fiat_incoming'))), 1, 1)
-        grid2.addWidget(QLabel(_("BTC outgoing")), 2, 0)
-        grid2.addWidget(QLabel(format_amount(flow['BTC_outgoing'])), 2, 1)
-        grid2.addWidget(QLabel(_("Fiat outgoing")), 3, 0)
-        grid2.addWidget(QLabel(format_fiat(flow.get('fiat_outgoing'))), 3, 1)
-        #
-        grid2.addWidget(QLabel(_("Realized capital gains")), 4, 0)
-        grid2.addWidget(QLabel(format_fiat(flow.get('realized_capital_gains'))), 4, 1)
+        for i, row in enumerate(flow_rows):
+            for j, text in enumerate(row):
+                grid2.addWidget(QLabel(text), i, j)
         vbox.addLayout(grid)
         vbox.addWidget(QLabel(_('Cash flow')))
         vbox.addLayout(grid2)
@@ -751,16 +1012,33 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
             if self.isColumnHidden(column):
                 continue
             column_title = self.hm.headerData(column, Qt.Horizontal, Qt.DisplayRole)
-            idx2 = idx.sibling(idx.row(), column)
-            clipboard_data = self.hm.data(idx2, self.ROLE_CLIPBOARD_DATA).value()
-            if clipboard_data is None:
-                clipboard_data = (self.hm.data(idx2, Qt.DisplayRole).value() or '').strip()
+            # the text is only computed if the action gets triggered
             cc.addAction(
                 column_title,
-                lambda text=clipboard_data, title=column_title:
-                self.place_text_on_clipboard(text, title=title))
+                lambda node=idx.internalPointer(), column=column, title=column_title:
+                self.place_text_on_clipboard(self._get_clipboard_text(node, column), title=title))
         return cc
 
+    def _edit_node(self, node: HistoryNode, column: int) -> None:
+        # note: this resolves the node's current position, like a persistent
+        #       index would, without the model having to track one while
+        #       the menu is open
+        parent = node.parent()
+        row = node.row()
+        if parent is None or row >= len(parent._children) or parent._children[row] is not node:
+            return  # the row got removed by a refresh in the meantime
+        idx = self.hm.createIndex(row, column, node)
+        self.edit(self.proxy.mapFromSource(idx))
+
+    def _get_clipboard_text(self, node: HistoryNode, column: int) -> str:
+        # note: the index is built from the node, as the rows of the model
+        #       may have changed while the menu was open
+        idx = self.hm.createIndex(node.row(), column, node)
+        clipboard_data = self.hm.data(idx, self.ROLE_CLIPBOARD_DATA)
+        if clipboard_data is None:
+            clipboard_data = (self.hm.data(idx, Qt.DisplayRole) or '').strip()
+        return clipboard_data
+
     def create_menu(self, position: QPoint):
         org_idx: QModelIndex = self.indexAt(position)
         idx = self.proxy.mapToSource(org_idx)
@@ -797,9 +1075,7 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
         for c in self.editable_columns:
             if self.isColumnHidden(c): continue
             label = self.hm.headerData(c, Qt.Horizontal, Qt.DisplayRole)
-            # TODO use siblingAtColumn when min Qt version is >=5.11
-            persistent = QPersistentModelIndex(org_idx.sibling(org_idx.row(), c))
-            menu_edit.addAction(_("{}").format(label), lambda p=persistent: self.edit(QModelIndex(p)))
+            menu_edit.addAction(_("{}").format(label), lambda node=idx.internalPointer(), c=c: self._edit_node(node, c))
         channel_id = tx_item.get('channel_id')
         if channel_id and self.wallet.lnworker and (chan := self.wallet.lnworker.get_channel_by_id(bytes.fromhex(channel_id))):
             menu.addAction(_("View Channel"), lambda: self.main_window.show_channel_details(chan))
@@ -882,17 +1158,6 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
     def do_export_history(self, file_name, is_csv):
         hist = self.wallet.get_detailed_history(fx=self.main_window.fx)
         txns = hist['transactions']
-        lines = []
-        if is_csv:
-            for item in txns:
-                lines.append([item['txid'],
-                              item.get('label', ''),
-                              item['confirmations'],
-                              item['bc_value'],
-                              item.get('fiat_value', ''),
-                              item.get('fee', ''),
-                              item.get('fiat_fee', ''),
-                              item['date']])
         with open(file_name, "w+", encoding='utf-8') as f:
             if is_csv:
                 import csv
@@ -905,8 +1170,14 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
                                       "fee",
                                       "fiat_fee",
                                       "timestamp"])
-                for line in lines:
-                    transaction.writerow(line)
+                transaction.writerows([item['txid'],
+                                       item.get('label', ''),
+                                       item['confirmations'],
+                                       item['bc_value'],
+                                       item.get('fiat_value', ''),
+                                       item.get('fee', ''),
+                                       item.get('fiat_fee', ''),
+                                       item['date']] for item in txns)
             else:
                 from electrum.util import json_encode
                 f.write(json_encode(txns))
@@ -916,7 +1187,20 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
 
     def get_role_data_from_coordinate(self, row, col, *, role):
         idx = self.model().mapToSource(self.model().index(row, col))
-        return self.hm.data(idx, role).value()
+        return self.hm.data(idx, role)
 
 
 HistoryColumns = HistoryList.Columns
+
+HistoryNode._display_handlers = {
+    HistoryColumns.STATUS: HistoryNode._render_status,
+    HistoryColumns.DESCRIPTION: HistoryNode._render_description,
+    HistoryColumns.ASSET: HistoryNode._render_asset,
+    HistoryColumns.AMOUNT: HistoryNode._render_amount,
+    HistoryColumns.BALANCE: HistoryNode._render_balance,
+    HistoryColumns.FIAT_VALUE: HistoryNode._render_fiat_value,
+    HistoryColumns.FIAT_ACQ_PRICE: HistoryNode._render_fiat_acq_price,
+    HistoryColumns.FIAT_CAP_GAINS: HistoryNode._render_fiat_cap_gains,
+    HistoryColumns.TXID: HistoryNode._render_txid,
+    HistoryColumns.SHORT_ID: HistoryNode._render_short_id,
+}
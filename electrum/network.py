@@ -1388,6 +1388,7 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         self.interfaces = {}
         self._connecting_ifaces.clear()
         self._closing_ifaces.clear()
+        blockchain.flush_blockchains(self.config)
         if not full_shutdown:
             util.trigger_callback('network_updated')
 
@@ -395,6 +395,9 @@ def run_in_hwd_thread(func: Callable[[], T]) -> T:
 def runs_in_hwd_thread(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        if threading.current_thread().name.startswith("hwd_comms_thread"):
+            # nested call: no need to bind the args for the executor
+            return func(*args, **kwargs)
         return run_in_hwd_thread(partial(func, *args, **kwargs))
     return wrapper
 
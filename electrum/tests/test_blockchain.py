@@ -1,8 +1,11 @@
+import asyncio
 import shutil
 import tempfile
 import os
+import threading
+from unittest import mock
 
-from electrum import constants, blockchain
+from electrum import constants, blockchain, util
 from electrum.simple_config import SimpleConfig
 from electrum.blockchain import Blockchain, deserialize_header, hash_header, InvalidHeader
 from electrum.util import bfh, make_dir
@@ -458,3 +461,263 @@ class TestVerifyHeader(ElectrumTestCase):
         with self.assertRaises(InvalidHeader):
             self.header["nonce"] = 42
             Blockchain.verify_header(self.header, self.prev_hash, self.target)
+
+
+def make_header(height: int, *, salt: int = 0, timestamp: int = None, bits: int = 0x1d00ffff) -> dict:
+    """Returns a made up header for height. Different salts give different
+    headers at the same height. Unless given, the timestamp is about a
+    minute per block after meowpow activation, with some jitter."""
+    if timestamp is None:
+        timestamp = constants.net.MeowpowActivationTS + height * 60 + (height * 37 + salt * 11) % 90 - 45
+    header = {
+        'version': 0x20000000 + height,
+        'prev_block_hash': (height * 2 + salt).to_bytes(32, 'big').hex(),
+        'merkle_root': (height * 3 + salt + 1).to_bytes(32, 'big').hex(),
+        'timestamp': timestamp,
+        'bits': bits,
+        'nonce': height * 7,
+    }
+    if timestamp >= constants.net.KawpowActivationTS:
+        header['nheight'] = height
+        header['mix_hash'] = (height * 5 + salt).to_bytes(32, 'big').hex()
+    header['block_height'] = height
+    return header
+
+
+class TestDeserializeChunk(ElectrumTestCase):
+
+    def test_roundtrip(self):
+        kawpow_ts = constants.net.KawpowActivationTS
+        headers = [make_header(h, timestamp=kawpow_ts + h) for h in range(1, 6)]
+        headers.append(make_header(6, timestamp=kawpow_ts - 1))  # padded pre-kawpow header
+        data = b''.join(blockchain.serialize_header_bytes(h) for h in headers)
+        self.assertEqual(headers, blockchain.deserialize_chunk(data, 1))
+
+    def test_invalid_length(self):
+        header = make_header(1, timestamp=constants.net.KawpowActivationTS)
+        data = blockchain.serialize_header_bytes(header)
+        with self.assertRaises(InvalidHeader):
+            blockchain.deserialize_chunk(data[:-1], 1)
+        with self.assertRaises(InvalidHeader):
+            blockchain.deserialize_chunk(data + bytes(1), 1)
+
+
+class TestChainworkCache(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        make_dir(util.get_headers_dir(self.config))
+        self._saved_cache = dict(blockchain._CHAINWORK_CACHE)
+
+    def tearDown(self):
+        blockchain._CHAINWORK_CACHE.clear()
+        blockchain._CHAINWORK_CACHE.update(self._saved_cache)
+        super().tearDown()
+
+    def test_save_and_load(self):
+        block_hash = (12345).to_bytes(32, 'big').hex()
+        blockchain._CHAINWORK_CACHE[block_hash] = 2 ** 100 + 7
+        blockchain.save_chainwork_cache(self.config)
+        del blockchain._CHAINWORK_CACHE[block_hash]
+        blockchain.load_chainwork_cache(self.config)
+        self.assertEqual(2 ** 100 + 7, blockchain._CHAINWORK_CACHE[block_hash])
+
+    def test_flush_only_when_dirty(self):
+        path = os.path.join(util.get_headers_dir(self.config), blockchain.CHAINWORK_CACHE_FILENAME)
+        with mock.patch.object(blockchain, '_chainwork_cache_dirty', False):
+            blockchain.flush_chainwork_cache(self.config)
+            self.assertFalse(os.path.exists(path))
+            blockchain._chainwork_cache_dirty = True
+            blockchain.flush_chainwork_cache(self.config)
+            self.assertTrue(os.path.exists(path))
+            self.assertFalse(blockchain._chainwork_cache_dirty)
+
+    def test_load_ignores_other_checkpoint(self):
+        block_hash = (12345).to_bytes(32, 'big').hex()
+        record = blockchain._CHAINWORK_RECORD
+        data = record.pack(bytes(31) + b'\x01', bytes(32))
+        data += record.pack(bytes.fromhex(block_hash), (99).to_bytes(32, 'big'))
+        with open(os.path.join(util.get_headers_dir(self.config), blockchain.CHAINWORK_CACHE_FILENAME), 'wb') as f:
+            f.write(data)
+        blockchain.load_chainwork_cache(self.config)
+        self.assertNotIn(block_hash, blockchain._CHAINWORK_CACHE)
+
+
+class TestTargetAndChainwork(ElectrumTestCase):
+    """Checks DGW targets and chain work past the checkpoints, against
+    stored headers. Only the first two DGW checkpoints are kept, so that
+    the test chains start at a small height."""
+
+    BITS = (0x1b0404cb, 0x1c00ffff, 0x1d00ffff, 0x1e0fffff, 0x1b123456)
+    NUM_HEADERS = 600  # stored on the best chain, after the checkpoints
+    FORK_OFFSET = 400  # forkpoint, relative to the first header after the checkpoints
+    NUM_FORK_HEADERS = 100
+
+    def setUp(self):
+        super().setUp()
+        net = constants.net
+        patcher = mock.patch.object(net, 'DGW_CHECKPOINTS', net.DGW_CHECKPOINTS[:2])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        make_dir(os.path.join(util.get_headers_dir(self.config), 'forks'))
+        blockchain.blockchains = {}
+        self.first_height = net.max_checkpoint() + 1
+        self.best = Blockchain(config=self.config, forkpoint=0, parent=None,
+                               forkpoint_hash=net.GENESIS, prev_hash=None)
+        blockchain.blockchains[net.GENESIS] = self.best
+        blockchain.init_headers_file_for_best_chain()
+        self.best.write(self._make_chunk(self.first_height, self.NUM_HEADERS, salt=0),
+                        self.first_height * blockchain.HEADER_SIZE)
+        forkpoint = self.first_height + self.FORK_OFFSET
+        self.fork = Blockchain(config=self.config, forkpoint=forkpoint, parent=self.best,
+                               forkpoint_hash=(1).to_bytes(32, 'big').hex(),
+                               prev_hash=(2).to_bytes(32, 'big').hex())
+        open(self.fork.path(), 'wb').close()
+        self.fork.write(self._make_chunk(forkpoint, self.NUM_FORK_HEADERS, salt=1), 0)
+
+    def _make_header(self, height: int, salt: int) -> dict:
+        return make_header(height, salt=salt, bits=self.BITS[(height // 40 + salt) % len(self.BITS)])
+
+    def _make_chunk(self, start_height: int, count: int, *, salt: int) -> bytes:
+        return b''.join(bfh(blockchain.serialize_header(self._make_header(h, salt)))
+                        for h in range(start_height, start_height + count))
+
+    def test_get_target_dgwv3(self):
+        h0 = self.first_height
+        window = blockchain.DGW_PASTBLOCKS + 1
+        self.assertEqual(0x3814843543a9e75bced7ccf507e39644b4e9b7452d9afba195535260fbb, self.best.get_target_dgwv3(h0 + window))
+        self.assertEqual(0x28a971b7f1f0bb30cd8bc3247b732f0af5f720d6185195b1bae8632f88e, self.best.get_target_dgwv3(h0 + 300))
+        self.assertEqual(0x388d3c25013c94649e736425c21fc95a67729afe503071d1d6de411a464, self.best.get_target_dgwv3(h0 + self.NUM_HEADERS))
+        with self.assertRaises(blockchain.NotEnoughHeaders):
+            self.best.get_target_dgwv3(h0 + window - 1)
+
+    def test_get_target_dgwv3_from_parent_chain(self):
+        # the window of the first fork headers is mostly stored on the parent
+        height = self.fork.forkpoint + 50
+        self.assertEqual(0x52cb6b644ee64f1982cd73165e2fab59000d6907987d4d5ef8d2caef624, self.fork.get_target_dgwv3(height))
+        self.assertEqual(0x38228ffedf64c03c7af6bc870876904608ff592d1c63d4c29ffd1de6094, self.fork.get_target_dgwv3(self.fork.height() + 1))
+
+    def test_get_target_dgwv3_with_zero_timestamps(self):
+        # headers passed in take precedence over the stored ones. a zero
+        # timestamp makes the reference loop skip the following timespan.
+        height = self.first_height + 300
+        chain = {
+            height - 1: {'timestamp': 0, 'bits': 0x1c00ffff},
+            height - 90: {'timestamp': 0, 'bits': 0x1d00ffff},
+            height - 91: self._make_header(height - 91, salt=2),
+        }
+        self.assertEqual(0x76d962ac0ecc602d4279a2a6e52087c76ce7f4af61975646b7de0e24bdb, self.best.get_target_dgwv3(height, chain))
+
+    def test_chainwork_of_headers(self):
+        # the range includes heights below the forkpoint, read from the
+        # parent chain, and difficulty reset heights on both sides of it
+        start = self.fork.forkpoint - 30
+        end = self.fork.height() + 1
+        resets = range(self.fork.forkpoint - 10, self.fork.forkpoint + 10)
+        for reset_heights in ('KAWPOW_RESET_HEIGHTS', 'MEOWPOW_RESET_HEIGHTS'):
+            with self.subTest(reset_heights), mock.patch.object(blockchain, reset_heights, resets):
+                expected = sum(self.fork.chainwork_of_header_at_height(h) for h in range(start, end))
+                self.assertEqual(expected, self.fork._chainwork_of_headers(start, end - start))
+
+
+class TestConnectChunk(ElectrumTestCase):
+    """connect_chunk verifies in a worker thread; meanwhile the event loop
+    keeps saving headers."""
+
+    NUM_HEADERS = 20  # stored on the best chain, after the checkpoints
+    FORK_OFFSET = 10
+    NUM_FORK_HEADERS = 5
+
+    def setUp(self):
+        super().setUp()
+        net = constants.net
+        # skip PoW and target checks, so that made up headers verify
+        patcher = mock.patch.multiple(
+            net,
+            TESTNET=True,
+            DGW_CHECKPOINTS=net.DGW_CHECKPOINTS[:2])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        make_dir(os.path.join(util.get_headers_dir(self.config), 'forks'))
+        blockchain.blockchains = {}
+        self.first_height = net.max_checkpoint() + 1
+        self.best = Blockchain(config=self.config, forkpoint=0, parent=None,
+                               forkpoint_hash=net.GENESIS, prev_hash=None)
+        blockchain.blockchains[net.GENESIS] = self.best
+        blockchain.init_headers_file_for_best_chain()
+        headers = self._make_headers(self.best, self.first_height, self.NUM_HEADERS, salt=0)
+        self.best.write(b''.join(map(blockchain.serialize_header_bytes, headers)),
+                        self.first_height * blockchain.HEADER_SIZE)
+        forkpoint = self.first_height + self.FORK_OFFSET
+        headers = self._make_headers(self.best, forkpoint, self.NUM_FORK_HEADERS, salt=1)
+        self.fork = Blockchain(config=self.config, forkpoint=forkpoint, parent=self.best,
+                               forkpoint_hash=hash_header(headers[0]),
+                               prev_hash=self.best.get_hash(forkpoint - 1))
+        open(self.fork.path(), 'wb').close()
+        self.fork.write(b''.join(map(blockchain.serialize_header_bytes, headers)), 0)
+        blockchain.blockchains[self.fork.get_id()] = self.fork
+
+    def _make_headers(self, chain: Blockchain, start_height: int, count: int, *, salt: int) -> list:
+        """Returns count headers, the first of which connects to chain."""
+        prev_hash = chain.get_hash(start_height - 1)
+        headers = []
+        for height in range(start_height, start_height + count):
+            header = make_header(height, salt=salt)
+            header['prev_block_hash'] = prev_hash
+            prev_hash = hash_header(header)
+            headers.append(header)
+        return headers
+
+    def _pause_verify_chunk(self, chain: Blockchain):
+        """Makes chain.verify_chunk wait, once done verifying, until the
+        returned event is set. Returns (verified, release) events."""
+        verified, release = threading.Event(), threading.Event()
+        verify_chunk = chain.verify_chunk
+
+        def paused_verify_chunk(*args):
+            verify_chunk(*args)
+            verified.set()
+            self.assertTrue(release.wait(timeout=10))
+        chain.verify_chunk = paused_verify_chunk
+        return verified, release
+
+    async def _connect_chunk_while(self, chain: Blockchain, headers: list, on_loop) -> bool:
+        verified, release = self._pause_verify_chunk(chain)
+        data = b''.join(map(blockchain.serialize_header_bytes, headers))
+        task = asyncio.ensure_future(chain.connect_chunk(headers[0]['block_height'], data.hex()))
+        while not verified.is_set() and not task.done():
+            await asyncio.sleep(0.01)
+        try:
+            self.assertTrue(verified.is_set())
+            # the chain lock must not be held while verifying
+            self.assertTrue(chain.lock.acquire(timeout=10))
+            chain.lock.release()
+            on_loop()
+        finally:
+            release.set()
+        return await task
+
+    async def test_save_header_while_verifying_chunk(self):
+        headers = self._make_headers(self.fork, self.fork.height() + 1, 10, salt=1)
+        next_header = self._make_headers(self.best, self.best.height() + 1, 1, salt=0)[0]
+        self.assertTrue(await self._connect_chunk_while(
+            self.fork, headers, lambda: self.best.save_header(next_header)))
+        # the fork became the longer chain and got swapped with its parent
+        self.assertIs(self.fork, blockchain.get_best_chain())
+        self.assertEqual(headers[-1]['block_height'], self.fork.height())
+        self.assertTrue(self.fork.check_header(headers[-1]))
+        self.assertTrue(self.best.check_header(next_header))
+
+    async def test_chain_changes_while_verifying_chunk(self):
+        best_height = self.best.height()
+        headers = self._make_headers(self.best, best_height + 1, 5, salt=0)
+        # another chunk replaces the last few headers the first one builds on
+        other_headers = self._make_headers(self.best, best_height - 2, 4, salt=2)
+        other_data = b''.join(map(blockchain.serialize_header_bytes, other_headers))
+        self.assertFalse(await self._connect_chunk_while(
+            self.best, headers, lambda: self.best.save_chunk(best_height - 2, other_data)))
+        self.assertEqual(best_height + 1, self.best.height())
+        self.assertTrue(self.best.check_header(other_headers[-1]))